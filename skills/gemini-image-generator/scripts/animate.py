@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Sprite Animation Builder
+Generate animation frames concurrently and assemble them into a sprite sheet.
+
+Every frame is generated from one prompt template and a shared reference
+image, cut out with Recraft background removal, then normalized: frames are
+cropped to their visible pixels and placed in equal cells on a common anchor
+(bottom-center by default, so feet stay on the ground). The cells are packed
+into a horizontal strip or a grid with 2px padding, as the game-assets-team
+sprite sheet guidelines specify, alongside JSON frame metadata and a ready
+CSS `steps()` animation.
+"""
+import argparse
+import json
+import os
+import string
+import sys
+
+import numpy as np
+from PIL import Image
+
+from concurrency import AIMDController, run_batch
+from trim import alpha_bbox
+
+DEFAULT_PADDING = 2
+ANCHORS = ("bottom", "center")
+
+
+class _KeepUnknown(dict):
+    """Leave placeholders other than ours, e.g. {style}, in the prompt as written."""
+
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+def frame_prompts(template: str, frames: int, poses: list = None) -> list:
+    """Expand {frame}, {frames} and {pose} placeholders for each frame.
+
+    Other {names} are kept literally. Raises ValueError unless every frame
+    gets its own prompt: the template needs {frame} or {pose}, and poses
+    must cover every frame. A malformed template also raises ValueError.
+    """
+    try:
+        fields = {field for _, field, _, _ in string.Formatter().parse(template) if field}
+    except ValueError as e:
+        raise ValueError(f"bad prompt template {template!r}: {e}") from e
+    if "frame" not in fields and "pose" not in fields:
+        raise ValueError("the prompt template needs a {frame} or {pose} placeholder")
+    if poses is not None and len(poses) < frames:
+        raise ValueError(f"{len(poses)} pose(s) given for {frames} frames")
+    if "frame" not in fields and not poses:
+        raise ValueError("a template using only {pose} needs --poses-file")
+    prompts = []
+    for index in range(frames):
+        pose = poses[index] if poses and index < len(poses) else ""
+        values = _KeepUnknown(frame=index + 1, frames=frames, pose=pose)
+        try:
+            prompts.append(template.format_map(values))
+        except (AttributeError, IndexError, KeyError, ValueError) as e:
+            raise ValueError(f"bad prompt template {template!r}: {e}") from e
+    return prompts
+
+
+def normalize_frames(frames: list, anchor: str = "bottom", frame_size: int = None) -> list:
+    """Crop frames to their visible pixels and place them in equal cells.
+
+    All frames share one scale factor, so relative sizes between poses are
+    preserved. Returns RGBA images of identical size.
+    """
+    crops = []
+    for frame in frames:
+        bbox = alpha_bbox(np.asarray(frame)[:, :, 3])
+        crops.append(frame.crop(bbox) if bbox else frame)
+
+    cell_w = max(c.width for c in crops)
+    cell_h = max(c.height for c in crops)
+    scale = 1.0
+    if frame_size:
+        scale = min(frame_size / cell_w, frame_size / cell_h)
+        cell_w = cell_h = frame_size
+
+    cells = []
+    for crop in crops:
+        if scale != 1.0:
+            size = (max(1, round(crop.width * scale)), max(1, round(crop.height * scale)))
+            crop = crop.resize(size, Image.LANCZOS)
+        cell = Image.new("RGBA", (cell_w, cell_h), (0, 0, 0, 0))
+        x = (cell_w - crop.width) // 2
+        y = cell_h - crop.height if anchor == "bottom" else (cell_h - crop.height) // 2
+        cell.paste(crop, (x, y))
+        cells.append(cell)
+    return cells
+
+
+def _next_pow2(value: int) -> int:
+    return 1 << (value - 1).bit_length()
+
+
+def assemble_sheet(cells: list, columns: int = None, padding: int = DEFAULT_PADDING,
+                   power_of_two: bool = False) -> tuple:
+    """Pack equal cells into a sheet; return (sheet, frame rectangles)."""
+    columns = columns or len(cells)
+    rows = -(-len(cells) // columns)
+    cell_w, cell_h = cells[0].size
+
+    width = columns * cell_w + (columns - 1) * padding
+    height = rows * cell_h + (rows - 1) * padding
+    if power_of_two:
+        width, height = _next_pow2(width), _next_pow2(height)
+
+    sheet = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    rects = []
+    for index, cell in enumerate(cells):
+        x = (index % columns) * (cell_w + padding)
+        y = (index // columns) * (cell_h + padding)
+        sheet.paste(cell, (x, y))
+        rects.append({"frame": index, "x": x, "y": y, "w": cell_w, "h": cell_h})
+    return sheet, rects
+
+
+def sheet_css(name: str, sheet_file: str, sheet_size: tuple, rects: list, fps: float) -> str:
+    """CSS class and keyframes that play the sheet."""
+    count = len(rects)
+    duration = count / fps
+    cell_w, cell_h = rects[0]["w"], rects[0]["h"]
+    lines = [
+        f".{name} {{",
+        f"  width: {cell_w}px;",
+        f"  height: {cell_h}px;",
+        f"  background: url('{sheet_file}') no-repeat 0 0;",
+        f"  background-size: {sheet_size[0]}px {sheet_size[1]}px;",
+    ]
+    single_row = all(r["y"] == 0 for r in rects)
+    if single_row:
+        # Every step advances by one cell plus padding.
+        stride = rects[1]["x"] if count > 1 else cell_w
+        lines += [
+            f"  animation: {name}-play {duration:g}s steps({count}) infinite;",
+            "}",
+            "",
+            f"@keyframes {name}-play {{",
+            "  from { background-position: 0 0; }",
+            f"  to {{ background-position: -{stride * count}px 0; }}",
+            "}",
+        ]
+    else:
+        lines += [
+            f"  animation: {name}-play {duration:g}s steps(1) infinite;",
+            "}",
+            "",
+            f"@keyframes {name}-play {{",
+        ]
+        for rect in rects:
+            percent = 100 * rect["frame"] / count
+            lines.append(f"  {percent:g}% {{ background-position: {-rect['x']}px {-rect['y']}px; }}")
+        lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def generate_frames(prompts: list, frame_paths: list, reference: str, remove_bg: bool,
+                    concurrency: int) -> bool:
+    """Generate (and cut out) every frame concurrently."""
+    from generate import create_client, generate_image
+    from recraft_process import remove_background
+
+    gemini_key = os.environ.get("GEMINI_API_KEY")
+    recraft_key = os.environ.get("RECRAFT_API_KEY")
+    if not gemini_key or (remove_bg and not recraft_key):
+        print("Error: GEMINI_API_KEY (and RECRAFT_API_KEY for background removal) "
+              "must be set.", file=sys.stderr)
+        return False
+
+    client = create_client(gemini_key)
+    if remove_bg:
+        raw_paths = [os.path.splitext(p)[0] + "-raw.png" for p in frame_paths]
+    else:
+        raw_paths = frame_paths
+
+    print(f"Generating {len(prompts)} frames...")
+    results = run_batch(
+        [(prompt, path, index) for index, (prompt, path) in enumerate(zip(prompts, raw_paths))],
+        # The frame index keeps frames out of generation coalescing.
+        lambda job: generate_image(client, job[0], job[1], reference, variant=f"frame{job[2]}"),
+        AIMDController(concurrency, maximum=max(concurrency, len(prompts))),
+    )
+    if not all(results):
+        print("Error: some frames failed to generate.", file=sys.stderr)
+        return False
+
+    if remove_bg:
+        results = run_batch(
+            list(zip(raw_paths, frame_paths)),
+            lambda job: remove_background(job[0], job[1], recraft_key),
+            AIMDController(concurrency, maximum=max(concurrency, len(prompts))),
+        )
+        if not all(results):
+            print("Error: background removal failed for some frames.", file=sys.stderr)
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate animation frames and assemble a sprite sheet with CSS/JSON metadata.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s --name bee_fly --frames 8 --reference bee.png \\
+      --prompt-template "Cute low-poly bee flapping its wings, frame {frame} of {frames}, side view"
+  %(prog)s --name bee_walk --frames 6 --poses-file walk-poses.txt \\
+      --prompt-template "Cute low-poly bee walking, {pose}" --columns 3 --frame-size 128
+  %(prog)s --name bee_fly --frames 8 --assemble-only
+        """
+    )
+    parser.add_argument("--name", required=True, help="Animation name (file names and CSS class)")
+    parser.add_argument("--frames", type=int, default=8, help="Number of frames (default: %(default)s)")
+    parser.add_argument(
+        "--prompt-template",
+        help="Prompt with optional {frame}, {frames} and {pose} placeholders"
+    )
+    parser.add_argument("--poses-file", help="Text file with one pose description per frame")
+    parser.add_argument("--reference", help="Shared reference image for every frame")
+    parser.add_argument("--output-dir", default=".", help="Where to write the sheet and frames")
+    parser.add_argument("--columns", type=int, help="Grid columns (default: one horizontal strip)")
+    parser.add_argument("--padding", type=int, default=DEFAULT_PADDING,
+                        help="Pixels between frames (default: %(default)s)")
+    parser.add_argument("--anchor", choices=ANCHORS, default="bottom",
+                        help="Frame alignment within its cell (default: %(default)s)")
+    parser.add_argument("--frame-size", type=int, help="Scale frames to fit square cells of this size")
+    parser.add_argument("--fps", type=float, default=10.0,
+                        help="Playback rate for the CSS/JSON metadata (default: %(default)s)")
+    parser.add_argument("--pot", action="store_true", help="Pad the sheet to power-of-two dimensions")
+    parser.add_argument("--no-remove-bg", action="store_true",
+                        help="Use generated frames as-is (they must already be transparent)")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Initial frames generated at once (default: %(default)s)")
+    parser.add_argument("--assemble-only", action="store_true",
+                        help="Skip generation and assemble existing frames")
+    args = parser.parse_args()
+    if args.frames < 1:
+        parser.error("--frames must be at least 1")
+
+    frames_dir = os.path.join(args.output_dir, f"{args.name}_frames")
+    os.makedirs(frames_dir, exist_ok=True)
+    frame_paths = [os.path.join(frames_dir, f"frame_{i:02d}.png") for i in range(args.frames)]
+
+    if not args.assemble_only:
+        if not args.prompt_template:
+            parser.error("--prompt-template is required unless --assemble-only is given")
+        poses = None
+        if args.poses_file:
+            with open(args.poses_file, "r", encoding="utf-8") as f:
+                poses = [line.strip() for line in f if line.strip()]
+        try:
+            prompts = frame_prompts(args.prompt_template, args.frames, poses)
+        except ValueError as e:
+            parser.error(str(e))
+        if not generate_frames(prompts, frame_paths, args.reference, not args.no_remove_bg,
+                               args.concurrency):
+            sys.exit(1)
+
+    missing = [p for p in frame_paths if not os.path.exists(p)]
+    if missing:
+        print(f"Error: missing frames: {', '.join(missing)}", file=sys.stderr)
+        sys.exit(1)
+
+    cells = normalize_frames([Image.open(p).convert("RGBA") for p in frame_paths],
+                             args.anchor, args.frame_size)
+    sheet, rects = assemble_sheet(cells, args.columns, args.padding, args.pot)
+
+    sheet_file = f"{args.name}.png"
+    sheet.save(os.path.join(args.output_dir, sheet_file), optimize=True)
+
+    metadata = {
+        "image": sheet_file,
+        "size": {"w": sheet.width, "h": sheet.height},
+        "frame_size": {"w": rects[0]["w"], "h": rects[0]["h"]},
+        "padding": args.padding,
+        "anchor": args.anchor,
+        "fps": args.fps,
+        "duration": round(len(rects) / args.fps, 3),
+        "frames": rects,
+    }
+    with open(os.path.join(args.output_dir, f"{args.name}.json"), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+    with open(os.path.join(args.output_dir, f"{args.name}.css"), "w", encoding="utf-8") as f:
+        f.write(sheet_css(args.name, sheet_file, sheet.size, rects, args.fps))
+
+    print(f"Sprite sheet saved to: {os.path.join(args.output_dir, sheet_file)} "
+          f"({sheet.width}x{sheet.height}, {len(rects)} frames)")
+
+
+if __name__ == "__main__":
+    main()
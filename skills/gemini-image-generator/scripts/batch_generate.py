@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Gemini Batch Generation
+Submit a manifest through the Gemini batch API for large, non-urgent runs.
+
+Batch jobs are billed at a discount and do not count against interactive
+rate limits, at the cost of latency (minutes to hours). Assets are packed
+into as few jobs as the inline request size limit allows, the jobs are
+polled with backoff, and each result is written to the asset's usual
+generate output path.
+
+Progress is tracked in a JSON state file next to the manifest, so an
+interrupted run can be resumed with `poll` without resubmitting anything.
+Set --base-url (or $GEMINI_BASE_URL) to run against a local mock server.
+"""
+import argparse
+import json
+import mimetypes
+import os
+import sys
+import time
+
+from generate import MODEL, create_client, save_response_image
+from manifest import asset_paths, load_manifest, next_stage
+
+MAX_JOB_BYTES = 15 * 1024 * 1024  # inline batch requests are capped at 20 MB
+MAX_JOB_REQUESTS = 1000
+TERMINAL_STATES = {
+    "JOB_STATE_SUCCEEDED",
+    "JOB_STATE_PARTIALLY_SUCCEEDED",
+    "JOB_STATE_FAILED",
+    "JOB_STATE_CANCELLED",
+    "JOB_STATE_EXPIRED",
+}
+RESULT_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED"}
+FAILED_STATES = TERMINAL_STATES - RESULT_STATES
+
+
+def state_path(manifest_path: str) -> str:
+    return os.path.splitext(manifest_path)[0] + ".batch.json"
+
+
+def load_state(path: str, model: str) -> dict:
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"model": model, "jobs": []}
+
+
+def save_state(path: str, state: dict):
+    # Write-then-rename so a crash mid-write never loses track of live jobs.
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def build_request(asset: dict) -> tuple:
+    """Return (inlined request, approximate encoded size) for an asset."""
+    parts = [{"text": asset["prompt"]}]
+    size = len(asset["prompt"].encode())
+    if asset.get("reference"):
+        with open(asset["reference"], "rb") as f:
+            data = f.read()
+        mime_type = mimetypes.guess_type(asset["reference"])[0] or "image/png"
+        parts.append({"inline_data": {"mime_type": mime_type, "data": data}})
+        size += len(data) * 4 // 3  # base64 on the wire
+    request = {
+        "contents": [{"role": "user", "parts": parts}],
+        "config": {"response_modalities": ["TEXT", "IMAGE"]},
+        "metadata": {"key": asset["name"]},
+    }
+    return request, size
+
+
+def pack_jobs(assets: list) -> list:
+    """Split assets into groups that each fit in one inline batch job."""
+    groups, current, current_size = [], [], 0
+    for asset in assets:
+        request, size = build_request(asset)
+        if current and (current_size + size > MAX_JOB_BYTES or len(current) >= MAX_JOB_REQUESTS):
+            groups.append(current)
+            current, current_size = [], 0
+        current.append((asset, request))
+        current_size += size
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _state_name(job) -> str:
+    return str(getattr(job.state, "value", job.state))
+
+
+def submit(client, assets: list, state: dict, state_file: str, skip_existing: bool) -> int:
+    """Create batch jobs for assets not already tracked; return jobs created.
+
+    An asset is tracked while a job for it is still open, or once a job has
+    saved its image. Assets that a finished job blocked or failed are
+    submitted again.
+    """
+    tracked = set()
+    for job in state["jobs"]:
+        tracked.update(job.get("saved", []))
+        if not job["fetched"] and job["state"] not in FAILED_STATES:
+            tracked.update(job["assets"])
+    pending = [a for a in assets if a["name"] not in tracked]
+    if skip_existing:
+        pending = [a for a in pending if not os.path.exists(asset_paths(a)["generate"])]
+    if not pending:
+        print("Nothing to submit: every asset is already tracked or generated.")
+        return 0
+
+    groups = pack_jobs(pending)
+    for index, group in enumerate(groups, 1):
+        job = client.batches.create(
+            model=state["model"],
+            src=[request for _, request in group],
+            config={"display_name": f"purria-assets-{int(time.time())}-{index}"},
+        )
+        state["jobs"].append({
+            "name": job.name,
+            "assets": [asset["name"] for asset, _ in group],
+            "state": _state_name(job),
+            "fetched": False,
+            "submitted_at": time.time(),
+        })
+        save_state(state_file, state)
+        print(f"Submitted {job.name} with {len(group)} asset(s)")
+    return len(groups)
+
+
+def fetch_results(batch_job, job: dict, assets: dict, queue_db: str = None) -> int:
+    """Write a finished job's images to their output paths; return the count saved.
+
+    Names of saved assets are recorded in job["saved"], so a resumed poll
+    neither rewrites those images nor enqueues their next stage again.
+    """
+    responses = getattr(batch_job.dest, "inlined_responses", None) or []
+    saved_names = job.setdefault("saved", [])
+    queue = None
+    if queue_db:
+        from jobqueue import JobQueue
+
+        queue = JobQueue(queue_db)
+
+    saved = 0
+    try:
+        for index, result in enumerate(responses):
+            # Responses carry our metadata key; fall back to submission order.
+            key = (result.metadata or {}).get("key") if result.metadata else None
+            name = key or (job["assets"][index] if index < len(job["assets"]) else None)
+            asset = assets.get(name)
+            if asset is None:
+                print(f"Warning: result for unknown asset {name!r} ignored", file=sys.stderr)
+                continue
+            if name in saved_names:
+                saved += 1
+                continue
+            if result.error:
+                print(f"Error for {name}: {result.error}", file=sys.stderr)
+                continue
+
+            output_path = asset_paths(asset)["generate"]
+            try:
+                os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+                if not save_response_image(result.response, output_path):
+                    print(f"Error for {name}: no image in response", file=sys.stderr)
+                    continue
+                print(f"Image saved to: {output_path}")
+                stage = next_stage(asset, "generate") if "generate" in asset["stages"] else None
+                if queue and stage:
+                    queue.enqueue(name, stage, asset, asset.get("priority", 0), unique=True)
+            except Exception as e:
+                print(f"Error for {name}: {type(e).__name__}: {e}", file=sys.stderr)
+                continue
+            saved_names.append(name)
+            saved += 1
+    finally:
+        if queue:
+            queue.close()
+    return saved
+
+
+def poll(client, assets: dict, state: dict, state_file: str, min_delay: float,
+         max_delay: float, queue_db: str = None) -> bool:
+    """Poll unfinished jobs with exponential backoff, fetching results as they land.
+
+    Returns True only if every submitted asset among assets was saved.
+    """
+    delay = min_delay
+    while True:
+        open_jobs = [j for j in state["jobs"] if not j["fetched"]]
+        if not open_jobs:
+            break
+
+        for job in open_jobs:
+            batch_job = client.batches.get(name=job["name"])
+            previous, job["state"] = job["state"], _state_name(batch_job)
+            if job["state"] != previous:
+                print(f"{job['name']}: {job['state']}")
+                delay = min_delay  # things are moving; check again soon
+            if job["state"] in TERMINAL_STATES:
+                if job["state"] in RESULT_STATES:
+                    saved = fetch_results(batch_job, job, assets, queue_db)
+                    print(f"{job['name']}: saved {saved}/{len(job['assets'])} image(s)")
+                job["fetched"] = True
+            save_state(state_file, state)
+
+        if all(j["fetched"] for j in state["jobs"]):
+            break
+        time.sleep(delay)
+        delay = min(max_delay, delay * 1.5)
+
+    saved = {name for job in state["jobs"] for name in job.get("saved", [])}
+    missing = sorted({name for job in state["jobs"] for name in job["assets"]
+                      if name in assets and name not in saved})
+    if missing:
+        print(f"Not generated: {', '.join(missing)}; submit again to retry them",
+              file=sys.stderr)
+    return not missing
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a manifest's images through the Gemini batch API.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s run --manifest assets.json
+  %(prog)s submit --manifest assets.json --skip-existing
+  %(prog)s poll --manifest assets.json --queue asset-queue.db
+  %(prog)s status --manifest assets.json
+        """
+    )
+    parser.add_argument(
+        "command",
+        choices=["submit", "poll", "run", "status"],
+        help="submit jobs, poll and fetch results, both (run), or show tracked jobs"
+    )
+    parser.add_argument(
+        "--manifest",
+        required=True,
+        help="Asset manifest (see manifest.py)"
+    )
+    parser.add_argument(
+        "--state",
+        help="Job tracking file (default: <manifest>.batch.json)"
+    )
+    parser.add_argument(
+        "--model",
+        default=MODEL,
+        help="Model for new jobs (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--skip-existing",
+        action="store_true",
+        help="Do not submit assets whose generated image already exists"
+    )
+    parser.add_argument(
+        "--queue",
+        metavar="DB",
+        help="Enqueue each fetched asset's next stage in this worker queue"
+    )
+    parser.add_argument(
+        "--poll-min",
+        type=float,
+        default=15.0,
+        help="Initial seconds between polls (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--poll-max",
+        type=float,
+        default=600.0,
+        help="Maximum seconds between polls (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--base-url",
+        help="Gemini API base URL, e.g. a local mock (default: $GEMINI_BASE_URL or Google)"
+    )
+    args = parser.parse_args()
+
+    state_file = args.state or state_path(args.manifest)
+    state = load_state(state_file, args.model)
+
+    if args.command == "status":
+        if not state["jobs"]:
+            print("No batch jobs tracked.")
+        for job in state["jobs"]:
+            fetched = "fetched" if job["fetched"] else "open"
+            print(f"{job['name']}  {job['state']:<32} {fetched:<8} {len(job['assets'])} asset(s)")
+        return
+
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        print("Error: GEMINI_API_KEY environment variable not set.", file=sys.stderr)
+        sys.exit(1)
+    client = create_client(api_key, args.base_url)
+
+    assets = [a for a in load_manifest(args.manifest) if "generate" in a["stages"]]
+    if args.command in ("submit", "run"):
+        submit(client, assets, state, state_file, args.skip_existing)
+    if args.command in ("poll", "run"):
+        by_name = {a["name"]: a for a in assets}
+        ok = poll(client, by_name, state, state_file, args.poll_min, args.poll_max, args.queue)
+        sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Content-Addressed Result Cache
+Share API results between threads and processes by input content hash.
+
+Every Gemini/Recraft operation is keyed by content_hash() over the operation
+name, its parameters and the bytes of its input files. single_flight() makes
+sure that only one call per key is in flight at a time:
+
+- threads in the same process wait on the leader and share its result;
+- other processes block on a lock file in the cache directory and pick up
+  the result the leader stored there.
+
+Deterministic operations (background removal, vectorization) keep their
+results, so repeat runs on unchanged inputs are free. Generation is not
+deterministic, so a generation result is only shared with callers that were
+already waiting while it was produced; a later identical request makes a
+fresh call.
+
+Set ASSET_CACHE_DIR to move the cache (e.g. onto a shared volume) and
+ASSET_CACHE=off to disable it.
+"""
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+CACHE_DIR = os.environ.get(
+    "ASSET_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "purria-assets")
+)
+CACHE_ENABLED = os.environ.get("ASSET_CACHE", "on").lower() not in ("0", "off", "false", "no")
+
+
+def hash_file(path: str) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_hash(operation: str, *values, files=()) -> str:
+    """Key for an operation: its name, parameters and input file contents."""
+    digest = hashlib.sha256(operation.encode())
+    for value in values:
+        digest.update(b"\0" + repr(value).encode())
+    for path in files:
+        digest.update(b"\0file:" + (hash_file(path) if path else "").encode())
+    return digest.hexdigest()
+
+
+class _FileLock:
+    """Exclusive lock on a file, held across processes (and hosts on NFS)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.path, "a+b")
+        if fcntl is not None:
+            fcntl.lockf(self.file, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    self.file.seek(0)
+                    msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.lockf(self.file, fcntl.LOCK_UN)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.file.close()
+        return False
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result_path = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _blob_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, key[:2], key)
+
+
+def _copy_out(source: str, output_path: str):
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    shutil.copyfile(source, output_path)
+
+
+def _read_state(lock_path: str) -> str:
+    # Only call this without holding the lock: closing any descriptor for the
+    # file drops this process's lockf() locks on it.
+    try:
+        with open(lock_path, "rb") as f:
+            return f.read().decode(errors="replace")
+    except OSError:
+        return ""
+
+
+def _locked_state(lock: _FileLock) -> str:
+    lock.file.seek(0)
+    return lock.file.read().decode(errors="replace")
+
+
+def _write_state(lock: _FileLock, state: str):
+    lock.file.seek(0)
+    lock.file.truncate()
+    lock.file.write(state.encode())
+    lock.file.flush()
+
+
+def single_flight(key: str, output_path: str, produce, persistent: bool = True) -> bool:
+    """Write the result for key to output_path, calling produce at most once
+    per concurrent group of callers.
+
+    produce(path) performs the real operation, writing its result to path,
+    and returns True on success. With persistent=False a stored result is
+    only reused by callers that arrived while it was being produced.
+    """
+    if not CACHE_ENABLED:
+        return produce(output_path)
+
+    blob = _blob_path(key)
+    lock_path = blob + ".lock"
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        flight.done.wait()
+        if flight.result_path is None:
+            return False
+        print(f"Reusing in-flight result for {os.path.basename(output_path)}")
+        _copy_out(flight.result_path, output_path)
+        return True
+
+    try:
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        # The lock file records "running <token>" while a leader produces and
+        # "done <token>" afterwards. A process that saw a flight running
+        # before it blocked on the lock may take that flight's result.
+        seen = _read_state(lock_path)
+        with _FileLock(lock_path) as lock:
+            state = _locked_state(lock)
+            joined = seen.startswith("running ") and state == "done " + seen.split(" ", 1)[1]
+            if os.path.exists(blob) and (persistent or joined):
+                print(f"Reusing cached result for {os.path.basename(output_path)}")
+                flight.result_path = blob
+            else:
+                token = uuid.uuid4().hex
+                _write_state(lock, "running " + token)
+                # Keep the output's extension: image writers pick the format from it.
+                extension = os.path.splitext(output_path)[1]
+                tmp_path = f"{blob}.{os.getpid()}.{threading.get_ident()}.tmp{extension}"
+                try:
+                    if produce(tmp_path):
+                        os.replace(tmp_path, blob)
+                        flight.result_path = blob
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    _write_state(lock, ("done " if flight.result_path else "failed ") + token)
+            if flight.result_path:
+                _copy_out(blob, output_path)
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+    return flight.result_path is not None
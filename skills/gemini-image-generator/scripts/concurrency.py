@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Adaptive Concurrency
+AIMD control of how many Gemini/Recraft calls are in flight at once.
+
+The window grows by one slot per window's worth of healthy responses
+(additive increase) and halves on a 429, a timeout or a latency spike
+(multiplicative decrease), the same way TCP finds a link's capacity. Only
+one decrease happens per congestion event: requests that started before the
+last decrease do not shrink the window again.
+"""
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RateLimited(Exception):
+    """The API answered 429 Too Many Requests."""
+
+
+def is_timeout(error: BaseException) -> bool:
+    """True for timeout errors from requests, httpx or the standard library."""
+    return isinstance(error, TimeoutError) or "Timeout" in type(error).__name__
+
+
+class AIMDController:
+    """Limit in-flight calls to a window that adapts to API health."""
+
+    def __init__(self, initial: float = 4, minimum: float = 1, maximum: float = 32,
+                 backoff: float = 0.5, spike_ratio: float = 2.5, warmup: int = 5):
+        self.window = float(initial)
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+        self.backoff = backoff
+        self.spike_ratio = spike_ratio
+        self.warmup = warmup
+
+        self.in_flight = 0
+        self.latency_avg = None
+        self.samples = 0
+        self.last_decrease = 0.0
+        self.peak_window = self.window
+        self.counts = {"succeeded": 0, "failed": 0, "throttled": 0, "timeouts": 0, "spikes": 0}
+        self.decisions = []
+        self._cond = threading.Condition()
+
+    def acquire(self) -> float:
+        """Block until a slot is free; return the request start time."""
+        with self._cond:
+            while self.in_flight >= int(self.window):
+                self._cond.wait()
+            self.in_flight += 1
+            return time.monotonic()
+
+    def release(self, started: float, outcome: str):
+        """Record a finished request.
+
+        outcome is "ok", "throttled", "timeout" or "error". Plain errors
+        (bad input, auth) say nothing about capacity and leave the window alone.
+        """
+        latency = time.monotonic() - started
+        with self._cond:
+            self.in_flight -= 1
+            if outcome == "ok":
+                self.counts["succeeded"] += 1
+                spike = self._is_spike(latency)
+                # Spikes feed the baseline too, so a lasting shift in latency
+                # becomes the new normal instead of pinning the window.
+                self._observe(latency)
+                if spike:
+                    self.counts["spikes"] += 1
+                    self._decrease(started, f"latency spike {latency:.1f}s")
+                else:
+                    self._increase()
+            elif outcome == "throttled":
+                self.counts["throttled"] += 1
+                self._decrease(started, "429 rate limited")
+            elif outcome == "timeout":
+                self.counts["timeouts"] += 1
+                self._decrease(started, "timeout")
+            else:
+                self.counts["failed"] += 1
+            self._cond.notify_all()
+
+    def _observe(self, latency: float):
+        self.samples += 1
+        if self.latency_avg is None:
+            self.latency_avg = latency
+        else:
+            self.latency_avg += 0.2 * (latency - self.latency_avg)
+
+    def _is_spike(self, latency: float) -> bool:
+        return (self.samples >= self.warmup
+                and latency > self.spike_ratio * self.latency_avg)
+
+    def _increase(self):
+        before = int(self.window)
+        self.window = min(self.maximum, self.window + 1.0 / self.window)
+        self.peak_window = max(self.peak_window, self.window)
+        if int(self.window) > before:
+            self._record("increase", "stable latency")
+
+    def _decrease(self, started: float, reason: str):
+        if started < self.last_decrease:
+            return  # already backed off for this congestion event
+        self.window = max(self.minimum, self.window * self.backoff)
+        self.last_decrease = time.monotonic()
+        self._record("decrease", reason)
+
+    def _record(self, action: str, reason: str):
+        decision = {"time": time.time(), "action": action, "reason": reason,
+                    "window": int(self.window)}
+        self.decisions.append(decision)
+        print(f"[concurrency] {action} to {int(self.window)} ({reason})", file=sys.stderr)
+
+    def call(self, fn, *args):
+        """Run fn(*args) inside a slot, classifying the outcome."""
+        started = self.acquire()
+        outcome = "error"
+        try:
+            result = fn(*args)
+            outcome = "ok" if result else "error"
+            return result
+        except RateLimited:
+            outcome = "throttled"
+            raise
+        except Exception as e:
+            if is_timeout(e):
+                outcome = "timeout"
+            raise
+        finally:
+            self.release(started, outcome)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "window": int(self.window),
+                "peak_window": int(self.peak_window),
+                "in_flight": self.in_flight,
+                "latency_avg": round(self.latency_avg, 3) if self.latency_avg else None,
+                **self.counts,
+                "decisions": list(self.decisions),
+            }
+
+
+def call_with_retry(controller: AIMDController, fn, item, retries: int = 3):
+    """Call fn(item) under the controller, retrying throttles and timeouts.
+
+    Retries happen after the window has shrunk, up to `retries` times. Any
+    other exception counts as a failure and returns False.
+    """
+    for tries in range(retries + 1):
+        try:
+            return controller.call(fn, item)
+        except Exception as e:
+            retryable = isinstance(e, RateLimited) or is_timeout(e)
+            if not retryable or tries == retries:
+                print(f"Error: {e}", file=sys.stderr)
+                return False
+            time.sleep(min(30.0, 2.0 ** tries))
+
+
+def run_batch(items: list, fn, controller: AIMDController, retries: int = 3) -> list:
+    """Call fn(item) for every item under the controller; return the results."""
+    with ThreadPoolExecutor(max_workers=int(controller.maximum)) as pool:
+        return list(pool.map(lambda item: call_with_retry(controller, fn, item, retries), items))
+
+
+def write_metrics(path: str, controller: AIMDController, extra: dict = None):
+    """Write the controller's state and decisions as JSON ('-' for stdout)."""
+    metrics = controller.snapshot()
+    metrics.update(extra or {})
+    if path == "-":
+        print(json.dumps(metrics, indent=2))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(metrics, f, indent=2)
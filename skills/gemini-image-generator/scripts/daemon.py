@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Gemini Generation Daemon
+Keep a warm Gemini client and accept generation jobs over a Unix socket.
+
+Starting generate.py costs an SDK import, environment lookup and a fresh
+HTTP connection on every call. The daemon pays that once. generate.py
+forwards to it automatically when the socket is live.
+
+Protocol: the client sends one JSON object per line, e.g.
+
+    {"op": "generate", "prompt": "...", "output": "/abs/out.png", "reference": null}
+
+and the daemon streams JSON status lines back on the same connection:
+
+    {"status": "accepted", "id": 3}
+    {"status": "running", "id": 3}
+    {"status": "done", "id": 3, "ok": true, "output": "/abs/out.png", "seconds": 8.4}
+
+Other ops: {"op": "ping"} and {"op": "shutdown"}.
+"""
+import argparse
+import itertools
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+DEFAULT_SOCKET = os.environ.get(
+    "GEMINI_DAEMON_SOCKET",
+    os.path.join(os.path.expanduser("~"), ".cache", "purria-assets", "generate.sock"),
+)
+
+
+def available() -> bool:
+    """Unix domain sockets are not available on every platform (e.g. Windows)."""
+    return hasattr(socket, "AF_UNIX")
+
+
+def _connect(socket_path: str, timeout: float = None):
+    if not available() or not os.path.exists(socket_path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def request(socket_path: str, message: dict, timeout: float = None):
+    """Send one request and yield the daemon's status messages.
+
+    Yields nothing if no daemon is listening on socket_path.
+    """
+    sock = _connect(socket_path, timeout)
+    if sock is None:
+        return
+    with sock, sock.makefile("rwb") as stream:
+        stream.write(json.dumps(message).encode() + b"\n")
+        stream.flush()
+        for line in stream:
+            yield json.loads(line)
+
+
+def submit(prompt: str, output_path: str, reference_path: str = None,
+           socket_path: str = DEFAULT_SOCKET):
+    """Generate through a running daemon.
+
+    Returns True/False for the job's outcome, or None if no daemon answered
+    (the caller should then generate in-process).
+    """
+    message = {
+        "op": "generate",
+        "prompt": prompt,
+        "output": os.path.abspath(output_path),
+        "reference": os.path.abspath(reference_path) if reference_path else None,
+    }
+    result = None
+    for status in request(socket_path, message):
+        if status["status"] == "accepted":
+            print(f"Forwarded to generation daemon (job {status['id']})")
+        elif status["status"] == "running":
+            print("Generating image...")
+        elif status["status"] == "done":
+            result = status["ok"]
+            if result:
+                print(f"Image saved to: {status['output']} ({status['seconds']:.1f}s)")
+            else:
+                print(f"Error: {status.get('error', 'generation failed')}", file=sys.stderr)
+        elif status["status"] == "error":
+            print(f"Error: {status['error']}", file=sys.stderr)
+            result = False
+    return result
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def send(self, **status):
+        self.wfile.write(json.dumps(status).encode() + b"\n")
+        self.wfile.flush()
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                self.send(status="error", error="invalid JSON")
+                continue
+            op = message.get("op")
+            if op == "ping":
+                self.send(status="ok", pid=os.getpid(), **self.server.controller.snapshot())
+            elif op == "shutdown":
+                self.send(status="ok")
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+            elif op == "generate":
+                self.generate(message)
+            else:
+                self.send(status="error", error=f"unknown op: {op}")
+            return
+
+    def generate(self, message: dict):
+        from concurrency import call_with_retry
+        from generate import generate_image
+
+        if not message.get("prompt") or not message.get("output"):
+            self.send(status="error", error="prompt and output are required")
+            return
+
+        job_id = next(self.server.ids)
+        self.send(status="accepted", id=job_id)
+        started = time.time()
+
+        def run(_):
+            # Sent once a concurrency slot is free, not while queued.
+            self.send(status="running", id=job_id)
+            return generate_image(self.server.client, message["prompt"],
+                                  message["output"], message.get("reference"))
+
+        try:
+            ok = bool(call_with_retry(self.server.controller, run, None))
+            error = None if ok else "generation failed"
+        except Exception as e:
+            ok, error = False, f"{type(e).__name__}: {e}"
+        self.send(status="done", id=job_id, ok=ok, output=message["output"],
+                  seconds=round(time.time() - started, 2), error=error)
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path: str, concurrency: int, max_concurrency: int):
+    from concurrency import AIMDController
+    from generate import create_client
+
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        print("Error: GEMINI_API_KEY environment variable not set.", file=sys.stderr)
+        sys.exit(1)
+
+    if os.path.exists(socket_path):
+        if _connect(socket_path, timeout=1.0) is not None:
+            print(f"Error: a daemon is already listening on {socket_path}", file=sys.stderr)
+            sys.exit(1)
+        os.remove(socket_path)  # stale socket from a crashed daemon
+    os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+
+    server = _Server(socket_path, _Handler)
+    server.client = create_client(api_key)
+    server.controller = AIMDController(concurrency, maximum=max_concurrency)
+    server.ids = itertools.count(1)
+    os.chmod(socket_path, 0o600)
+
+    print(f"Generation daemon listening on {socket_path} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        print("Generation daemon stopped.")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run or control the Gemini generation daemon.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s serve &
+  %(prog)s status
+  %(prog)s stop
+        """
+    )
+    parser.add_argument(
+        "--socket",
+        default=DEFAULT_SOCKET,
+        help="Unix socket path (default: $GEMINI_DAEMON_SOCKET or ~/.cache/purria-assets/generate.sock)"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="Run the daemon in the foreground")
+    serve_parser.add_argument("--concurrency", type=int, default=4,
+                              help="Initial generations in flight (default: %(default)s)")
+    serve_parser.add_argument("--max-concurrency", type=int, default=16,
+                              help="Upper bound for the adaptive window (default: %(default)s)")
+    subparsers.add_parser("status", help="Check whether the daemon is running")
+    subparsers.add_parser("stop", help="Ask a running daemon to exit")
+    args = parser.parse_args()
+
+    if not available():
+        print("Error: Unix domain sockets are not supported on this platform.", file=sys.stderr)
+        sys.exit(1)
+
+    if args.command == "serve":
+        serve(args.socket, args.concurrency, args.max_concurrency)
+        return
+
+    op = "ping" if args.command == "status" else "shutdown"
+    replies = list(request(args.socket, {"op": op}, timeout=5.0))
+    if not replies:
+        print(f"No daemon running on {args.socket}")
+        sys.exit(1)
+    if args.command == "status":
+        reply = replies[0]
+        print(f"Daemon running (pid {reply['pid']}), concurrency window {reply['window']}, "
+              f"{reply['in_flight']} in flight, {reply['succeeded']} succeeded")
+    else:
+        print("Daemon stopping.")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,88 +8,120 @@ import base64
 import io
 import os
 import sys
+import time
 
-from google import genai
-from google.genai import types
 from PIL import Image
 
+from cache import content_hash, single_flight
+from concurrency import AIMDController, RateLimited, is_timeout, run_batch, write_metrics
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Generate images using Google Gemini.",
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
-Examples:
-  %(prog)s --prompt "A cat in space" --output cat.png
-  %(prog)s --prompt "Same style but blue" --reference input.png --output blue.png
-        """
-    )
-    parser.add_argument(
-        "--prompt",
-        required=True,
-        help="Text prompt describing the image to generate"
-    )
-    parser.add_argument(
-        "--output",
-        required=True,
-        help="Output file path for the generated image"
-    )
-    parser.add_argument(
-        "--reference",
-        help="Optional reference image path for style/content guidance"
+
+MODEL = "gemini-2.0-flash-exp"
+
+
+def create_client(api_key: str, base_url: str = None):
+    """Create a Gemini client for the given API key.
+
+    base_url (or $GEMINI_BASE_URL) points the client at another endpoint,
+    such as a local mock server.
+    """
+    # The SDK is imported lazily: it is slow to load, and the daemon client
+    # path in main() never needs it.
+    from google import genai
+    from google.genai import types
+
+    base_url = base_url or os.environ.get("GEMINI_BASE_URL")
+    http_options = types.HttpOptions(base_url=base_url) if base_url else None
+    return genai.Client(api_key=api_key, http_options=http_options)
+
+
+def generate_image(client, prompt: str, output_path: str, reference_path: str = None,
+                   variant=None) -> bool:
+    """Generate an image with Gemini and save it to output_path.
+
+    Concurrent calls with the same prompt, reference and variant (from this
+    or another process) share a single API call. Pass a distinct variant,
+    such as a regeneration count, when a different image is required.
+    """
+    if reference_path and not os.path.exists(reference_path):
+        print(f"Error: Reference image '{reference_path}' not found.", file=sys.stderr)
+        return False
+
+    # Create output directory if it doesn't exist
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        print(f"Created output directory: {output_dir}")
+
+    key = content_hash("generate", MODEL, prompt, variant, files=[reference_path])
+    success = single_flight(
+        key, output_path,
+        lambda path: _generate_image(client, prompt, path, reference_path),
+        persistent=False,
     )
-    args = parser.parse_args()
+    if success:
+        print(f"Image saved to: {output_path}")
+    return success
 
-    # Get API key from environment
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        print("Error: GEMINI_API_KEY environment variable not set.", file=sys.stderr)
-        print("Set it with:", file=sys.stderr)
-        print("  Unix: export GEMINI_API_KEY='your-api-key'", file=sys.stderr)
-        print("  PowerShell: $env:GEMINI_API_KEY = 'your-api-key'", file=sys.stderr)
-        sys.exit(1)
 
-    client = genai.Client(api_key=api_key)
+def _generate_image(client, prompt: str, output_path: str, reference_path: str = None) -> bool:
+    from google.genai import types
 
     # Build content list
-    contents = [args.prompt]
+    contents = [prompt]
 
     # Add reference image if provided
-    if args.reference:
+    if reference_path:
         try:
-            reference_image = Image.open(args.reference)
+            reference_image = Image.open(reference_path)
             contents.append(reference_image)
-            print(f"Using reference image: {args.reference}")
+            print(f"Using reference image: {reference_path}")
         except FileNotFoundError:
-            print(f"Error: Reference image '{args.reference}' not found.", file=sys.stderr)
-            sys.exit(1)
+            print(f"Error: Reference image '{reference_path}' not found.", file=sys.stderr)
+            return False
         except Exception as e:
             print(f"Error loading reference image: {e}", file=sys.stderr)
-            sys.exit(1)
-
-    # Create output directory if it doesn't exist
-    output_dir = os.path.dirname(args.output)
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-        print(f"Created output directory: {output_dir}")
+            return False
 
     print("Generating image...")
 
     try:
         response = client.models.generate_content(
-            model="gemini-2.0-flash-exp",
+            model=MODEL,
             contents=contents,
             config=types.GenerateContentConfig(
                 response_modalities=["Text", "Image"],
             )
         )
     except Exception as e:
+        if getattr(e, "code", None) == 429:
+            raise RateLimited(f"Gemini: {e}") from e
+        if is_timeout(e):
+            raise
         print(f"Error generating image: {e}", file=sys.stderr)
-        sys.exit(1)
+        return False
+
+    return save_response_image(response, output_path)
+
+
+def save_response_image(response, output_path: str) -> bool:
+    """Save the image part of a generate_content response to output_path.
+
+    Returns False when the response has no candidates or content, as happens
+    when a prompt is blocked.
+    """
+    candidates = getattr(response, "candidates", None) or []
+    content = candidates[0].content if candidates else None
+    if content is None or not content.parts:
+        feedback = getattr(response, "prompt_feedback", None)
+        reason = getattr(feedback, "block_reason", None) or (
+            getattr(candidates[0], "finish_reason", None) if candidates else None)
+        print(f"Warning: response has no content{f' ({reason})' if reason else ''}.",
+              file=sys.stderr)
+        return False
 
-    # Process response
     image_saved = False
-    for part in response.candidates[0].content.parts:
+    for part in content.parts:
         if part.text is not None:
             print(f"Model response: {part.text}")
         elif part.inline_data is not None:
@@ -103,13 +135,12 @@ Examples:
                 
                 # Open and save the image
                 generated_image = Image.open(io.BytesIO(image_bytes))
-                generated_image.save(args.output)
-                print(f"Image saved to: {args.output}")
+                generated_image.save(output_path)
                 image_saved = True
             except Exception as e:
                 print(f"Error processing image data: {e}", file=sys.stderr)
                 # Try saving raw data for debugging
-                debug_path = args.output + ".debug.bin"
+                debug_path = output_path + ".debug.bin"
                 with open(debug_path, "wb") as f:
                     if isinstance(part.inline_data.data, str):
                         f.write(part.inline_data.data.encode())
@@ -119,6 +150,116 @@ Examples:
 
     if not image_saved:
         print("Warning: No image was generated in the response.", file=sys.stderr)
+    return image_saved
+
+
+def generate_manifest(client, args) -> bool:
+    """Generate every asset in a manifest with adaptive concurrency."""
+    from manifest import asset_paths, load_manifest
+
+    assets = [a for a in load_manifest(args.manifest) if "generate" in a["stages"]]
+    controller = AIMDController(args.concurrency, maximum=args.max_concurrency)
+    started = time.time()
+    results = run_batch(
+        assets,
+        lambda asset: generate_image(client, asset["prompt"], asset_paths(asset)["generate"],
+                                     asset.get("reference")),
+        controller,
+    )
+
+    succeeded = sum(1 for r in results if r)
+    elapsed = time.time() - started
+    print(f"Generated {succeeded}/{len(assets)} images in {elapsed:.1f}s "
+          f"(final concurrency {controller.snapshot()['window']})")
+    if args.metrics:
+        write_metrics(args.metrics, controller,
+                      {"action": "generate", "images": len(assets),
+                       "succeeded_images": succeeded, "elapsed": round(elapsed, 2)})
+    return succeeded == len(assets)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate images using Google Gemini.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s --prompt "A cat in space" --output cat.png
+  %(prog)s --prompt "Same style but blue" --reference input.png --output blue.png
+  %(prog)s --manifest assets.json --metrics metrics.json
+        """
+    )
+    parser.add_argument(
+        "--prompt",
+        help="Text prompt describing the image to generate"
+    )
+    parser.add_argument(
+        "--output",
+        help="Output file path for the generated image"
+    )
+    parser.add_argument(
+        "--reference",
+        help="Optional reference image path for style/content guidance"
+    )
+    parser.add_argument(
+        "--manifest",
+        help="Batch mode: generate every asset in this manifest"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Batch mode: initial number of requests in flight (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=32,
+        help="Batch mode: upper bound for the adaptive window (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--metrics",
+        help="Batch mode: write concurrency metrics as JSON to this path ('-' for stdout)"
+    )
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Generate in this process even if a generation daemon is running"
+    )
+    args = parser.parse_args()
+
+    if not args.manifest and not (args.prompt and args.output):
+        parser.error("--prompt and --output are required unless --manifest is given")
+
+    # Hand single generations to a running daemon (see daemon.py); it holds
+    # the warm client, so this process never loads the SDK.
+    if not args.manifest and not args.no_daemon:
+        from daemon import submit
+
+        forwarded = submit(args.prompt, args.output, args.reference)
+        if forwarded is not None:
+            sys.exit(0 if forwarded else 1)
+
+    # Get API key from environment
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        print("Error: GEMINI_API_KEY environment variable not set.", file=sys.stderr)
+        print("Set it with:", file=sys.stderr)
+        print("  Unix: export GEMINI_API_KEY='your-api-key'", file=sys.stderr)
+        print("  PowerShell: $env:GEMINI_API_KEY = 'your-api-key'", file=sys.stderr)
+        sys.exit(1)
+
+    client = create_client(api_key)
+
+    if args.manifest:
+        sys.exit(0 if generate_manifest(client, args) else 1)
+
+    try:
+        success = generate_image(client, args.prompt, args.output, args.reference)
+    except Exception as e:
+        print(f"Error generating image: {e}", file=sys.stderr)
+        success = False
+    if not success:
         sys.exit(1)
 
 
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Asset Job Queue
+SQLite-backed job queue with leases, priorities and retries.
+
+Several worker processes (on one machine or several machines sharing a
+volume) can open the same database file. Claiming a job takes a write lock
+for the duration of a single short transaction, so each job is leased to
+exactly one worker. A job whose lease expires (the worker crashed or was
+killed) is returned to the queue on the next claim.
+"""
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+
+DEFAULT_DB = os.environ.get("ASSET_QUEUE_DB", "asset-queue.db")
+DEFAULT_LEASE = 600.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    asset TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (state, priority DESC, id);
+"""
+
+
+def worker_id() -> str:
+    """Return a worker identifier unique across hosts and processes."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class JobQueue:
+    """A persistent queue of pipeline stage jobs stored in SQLite."""
+
+    def __init__(self, path: str = DEFAULT_DB, timeout: float = 30.0):
+        self.path = path
+        # isolation_level=None: transactions are managed explicitly below so
+        # that claims can use BEGIN IMMEDIATE and take the write lock up front.
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _transaction(self):
+        return _Transaction(self.conn)
+
+    def enqueue(self, asset: str, stage: str, payload: dict, priority: int = 0,
+                max_attempts: int = DEFAULT_MAX_ATTEMPTS, delay: float = 0.0,
+                unique: bool = False) -> int:
+        """Add a job to the queue and return its id.
+
+        With unique=True, an existing queued or leased job for the same asset
+        and stage is reused instead of adding another.
+        """
+        with self._transaction():
+            if unique:
+                row = self.conn.execute(
+                    "SELECT id FROM jobs WHERE asset = ? AND stage = ?"
+                    " AND state IN ('queued', 'leased') ORDER BY id LIMIT 1",
+                    (asset, stage),
+                ).fetchone()
+                if row is not None:
+                    return row["id"]
+            return self._insert(asset, stage, payload, priority, max_attempts, delay)
+
+    def _insert(self, asset, stage, payload, priority, max_attempts, delay=0.0):
+        now = time.time()
+        cur = self.conn.execute(
+            "INSERT INTO jobs (asset, stage, payload, priority, max_attempts,"
+            " available_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (asset, stage, json.dumps(payload), priority, max_attempts, now + delay, now, now),
+        )
+        return cur.lastrowid
+
+    def claim(self, owner: str, lease: float = DEFAULT_LEASE, stages: list = None):
+        """Lease the highest-priority runnable job to owner, or return None."""
+        now = time.time()
+        with self._transaction():
+            # Return jobs from dead workers to the queue (or fail them once
+            # they have used up their attempts).
+            self.conn.execute(
+                "UPDATE jobs SET state = CASE WHEN attempts >= max_attempts"
+                " THEN 'failed' ELSE 'queued' END,"
+                " last_error = COALESCE(last_error, 'lease expired'),"
+                " lease_owner = NULL, lease_expires = NULL, updated_at = ?"
+                " WHERE state = 'leased' AND lease_expires < ?",
+                (now, now),
+            )
+
+            query = "SELECT * FROM jobs WHERE state = 'queued' AND available_at <= ?"
+            params = [now]
+            if stages:
+                query += f" AND stage IN ({','.join('?' * len(stages))})"
+                params.extend(stages)
+            query += " ORDER BY priority DESC, id LIMIT 1"
+
+            row = self.conn.execute(query, params).fetchone()
+            if row is None:
+                return None
+
+            self.conn.execute(
+                "UPDATE jobs SET state = 'leased', lease_owner = ?, lease_expires = ?,"
+                " attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (owner, now + lease, now, row["id"]),
+            )
+
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["attempts"] += 1
+        return job
+
+    def renew(self, job_id: int, owner: str, lease: float = DEFAULT_LEASE) -> bool:
+        """Extend a lease still held by owner. Returns False if it was lost."""
+        now = time.time()
+        with self._transaction():
+            cur = self.conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ?"
+                " WHERE id = ? AND lease_owner = ? AND state = 'leased'",
+                (now + lease, now, job_id, owner),
+            )
+        return cur.rowcount == 1
+
+    def complete(self, job_id: int, owner: str, next_jobs: list = ()) -> bool:
+        """Mark a job done and enqueue its follow-up jobs atomically.
+
+        next_jobs is a list of (asset, stage, payload, priority) tuples. If
+        owner no longer holds the lease, nothing is changed and False is
+        returned, so a job is never advanced twice.
+        """
+        now = time.time()
+        with self._transaction():
+            cur = self.conn.execute(
+                "UPDATE jobs SET state = 'done', lease_owner = NULL, lease_expires = NULL,"
+                " last_error = NULL, updated_at = ?"
+                " WHERE id = ? AND lease_owner = ? AND state = 'leased'",
+                (now, job_id, owner),
+            )
+            if cur.rowcount != 1:
+                return False
+            for asset, stage, payload, priority in next_jobs:
+                self._insert(asset, stage, payload, priority, DEFAULT_MAX_ATTEMPTS)
+        return True
+
+    def fail(self, job_id: int, owner: str, error: str, retry_delay: float = 5.0) -> bool:
+        """Record a failed attempt; requeue with backoff or mark failed."""
+        now = time.time()
+        with self._transaction():
+            row = self.conn.execute(
+                "SELECT attempts, max_attempts FROM jobs"
+                " WHERE id = ? AND lease_owner = ? AND state = 'leased'",
+                (job_id, owner),
+            ).fetchone()
+            if row is None:
+                return False
+            if row["attempts"] >= row["max_attempts"]:
+                state, available_at = "failed", now
+            else:
+                state = "queued"
+                available_at = now + retry_delay * (2 ** (row["attempts"] - 1))
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, available_at = ?, last_error = ?,"
+                " lease_owner = NULL, lease_expires = NULL, updated_at = ? WHERE id = ?",
+                (state, available_at, error, now, job_id),
+            )
+        return True
+
+    def retry_failed(self) -> int:
+        """Requeue all failed jobs with a fresh attempt budget."""
+        now = time.time()
+        with self._transaction():
+            cur = self.conn.execute(
+                "UPDATE jobs SET state = 'queued', attempts = 0, available_at = ?,"
+                " updated_at = ? WHERE state = 'failed'",
+                (now, now),
+            )
+        return cur.rowcount
+
+    def counts(self) -> list:
+        """Return (stage, state, count) rows for a status summary."""
+        rows = self.conn.execute(
+            "SELECT stage, state, COUNT(*) AS n FROM jobs GROUP BY stage, state"
+            " ORDER BY stage, state"
+        ).fetchall()
+        return [(r["stage"], r["state"], r["n"]) for r in rows]
+
+    def pending(self) -> int:
+        """Return the number of jobs that are queued or leased."""
+        row = self.conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'leased')"
+        ).fetchone()
+        return row[0]
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, rolled back on error."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        return False
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Asset Manifest
+Load asset definitions shared by the batch tools (worker, etc.).
+
+A manifest is a JSON file:
+
+    {
+      "output_dir": "assets",
+      "assets": [
+        {"name": "robot", "prompt": "Cute robot companion", "reference": "style.png",
+         "gate": {"min_size": 512, "min_aspect": 0.9, "max_aspect": 1.1}},
+        {"name": "coin", "prompt_file": "prompts/coin.txt", "priority": 5,
+         "trim_threshold": 8, "trim_padding": 4, "colors": 8, "dedupe": {"max_distance": 4}}
+      ]
+    }
+
+Relative paths are resolved against the manifest's directory. Setting
+"colors" adds a local quantize stage before vectorize. "gate" holds quality
+gate limits (see quality.py), or false to skip the gate. "dedupe" holds
+near-duplicate settings (max_distance, action, algorithm; see phash.py), or
+false to skip the check. "stages" runs part of the pipeline; a prompt is
+only required when it includes generate. If it does not start at generate,
+the first stage reads "input", or else the file the stage before it would
+have produced; that file must exist when the manifest loads.
+"""
+import json
+import os
+
+PIPELINE = ["generate", "gate", "dedupe", "remove-bg", "trim", "vectorize"]
+STAGES = set(PIPELINE) | {"quantize"}
+# Stages that check an image and hand the same file on to the next stage.
+PASS_THROUGH = ("gate", "dedupe")
+
+
+def _resolve(base_dir: str, path: str) -> str:
+    if not path or os.path.isabs(path):
+        return path
+    return os.path.normpath(os.path.join(base_dir, path))
+
+
+def default_stages(colors: int = None, gate: bool = True, dedupe: bool = True) -> list:
+    """Return the standard pipeline, with a quantize pre-pass if colors is set."""
+    stages = list(PIPELINE)
+    if not gate:
+        stages.remove("gate")
+    if not dedupe:
+        stages.remove("dedupe")
+    if colors:
+        from quantize import check_colors
+
+        check_colors(colors)
+        stages.insert(stages.index("vectorize"), "quantize")
+    return stages
+
+
+def load_manifest(path: str) -> list:
+    """Load a manifest file and return its assets with resolved paths."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    default_output_dir = _resolve(base_dir, data.get("output_dir", "."))
+
+    assets = []
+    for entry in data.get("assets", []):
+        if "name" not in entry:
+            raise ValueError(f"Manifest entry missing 'name': {entry}")
+
+        asset = dict(entry)
+        if "prompt_file" in asset:
+            asset["prompt_file"] = _resolve(base_dir, asset["prompt_file"])
+            with open(asset["prompt_file"], "r", encoding="utf-8") as f:
+                asset["prompt"] = f.read().strip()
+
+        if asset.get("reference"):
+            asset["reference"] = _resolve(base_dir, asset["reference"])
+        asset["output_dir"] = _resolve(base_dir, asset.get("output_dir", default_output_dir))
+        asset.setdefault("stages", default_stages(asset.get("colors"),
+                                                  asset.get("gate") is not False,
+                                                  asset.get("dedupe") is not False))
+        asset.setdefault("priority", 0)
+
+        unknown = [stage for stage in asset["stages"] if stage not in STAGES]
+        if unknown:
+            raise ValueError(f"Manifest entry '{asset['name']}' has unknown stages: {unknown}")
+        if "generate" in asset["stages"] and not asset.get("prompt"):
+            raise ValueError(f"Manifest entry '{asset['name']}' has no prompt")
+        if asset.get("input"):
+            asset["input"] = _resolve(base_dir, asset["input"])
+        if asset["stages"] and asset["stages"][0] != "generate":
+            source = stage_input(asset, asset["stages"][0])
+            if not os.path.exists(source):
+                raise ValueError(
+                    f"Manifest entry '{asset['name']}' starts at '{asset['stages'][0]}' but its "
+                    f"input {source} does not exist; set 'input' or generate it first"
+                )
+        assets.append(asset)
+
+    return assets
+
+
+def asset_paths(asset: dict) -> dict:
+    """Return the file produced by each pipeline stage for an asset."""
+    out = asset["output_dir"]
+    name = asset["name"]
+    return {
+        "generate": os.path.join(out, f"{name}.png"),
+        "remove-bg": os.path.join(out, f"{name}-nobg.png"),
+        "trim": os.path.join(out, f"{name}-trim.png"),
+        "quantize": os.path.join(out, f"{name}-quant.png"),
+        "vectorize": os.path.join(out, f"{name}.svg"),
+    }
+
+
+def duplicate_marker(asset: dict) -> str:
+    """Return the file recording that an asset duplicates an earlier one."""
+    return os.path.join(asset["output_dir"], f"{asset['name']}.duplicate.json")
+
+
+def stage_input(asset: dict, stage: str) -> str:
+    """Return the file a stage reads: the output of the stage before it.
+
+    Pass-through stages (gate, dedupe) write nothing, so a stage after one
+    reads whatever that stage read. The first stage of a partial pipeline
+    reads the asset's "input" file if one is given, else the output of the
+    stage before it in the full pipeline (e.g. ["remove-bg", "vectorize"]
+    starts from <name>.png).
+    """
+    stages = asset["stages"]
+    index = stages.index(stage)
+    if index > 0:
+        previous = stages[index - 1]
+        if previous in PASS_THROUGH:
+            return stage_input(asset, previous)
+        return asset_paths(asset)[previous]
+    if stage == "generate":
+        return None
+    if asset.get("input"):
+        return asset["input"]
+    full = list(PIPELINE)
+    if asset.get("colors") or stage == "quantize":
+        full.insert(full.index("vectorize"), "quantize")
+    previous = full[full.index(stage) - 1]
+    if previous in PASS_THROUGH:
+        return stage_input(dict(asset, stages=full), previous)
+    return asset_paths(asset)[previous]
+
+
+def next_stage(asset: dict, stage: str) -> str:
+    stages = asset["stages"]
+    index = stages.index(stage)
+    return stages[index + 1] if index + 1 < len(stages) else None
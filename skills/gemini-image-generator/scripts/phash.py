@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Perceptual Hash Index
+Find near-duplicate generated images before they reach Recraft.
+
+Each image is cropped to its subject (everything that differs from the
+background colour) and reduced to two 64-bit perceptual hashes, a dHash and
+a DCT-based pHash; visually similar images have hashes a small Hamming
+distance apart. Cropping matters for game icons: a small object on a large
+flat canvas otherwise hashes as almost nothing but background.
+
+Candidates are found with the primary hash and must also be close on the
+other one before they count as duplicates. Hashes are stored in SQLite so the
+index persists and can be shared by several workers, and are held in memory
+in a BK-tree so a lookup only visits a small fraction of the index even at
+tens of thousands of assets.
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_INDEX = os.environ.get("ASSET_HASH_INDEX", "asset-hashes.db")
+DEFAULT_DISTANCE = 4
+DEFAULT_CONFIRM_DISTANCE = 6
+ALGORITHMS = ("dhash", "phash")
+BACKGROUND_TOLERANCE = 24
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    path TEXT NOT NULL,
+    algorithm TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    confirm TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS hashes_key ON hashes (key, algorithm);
+"""
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int("".join("1" if b else "0" for b in bits.reshape(-1)), 2)
+
+
+def _grayscale(image: Image.Image) -> Image.Image:
+    # Composite transparent sprites onto white so the alpha shape counts.
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGBA", image.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, image)
+    return image.convert("L")
+
+
+def _subject(image: Image.Image) -> Image.Image:
+    """Grayscale crop to the pixels that differ from the border colour."""
+    gray = _grayscale(image)
+    pixels = np.asarray(gray, dtype=np.int16)
+    border = np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]])
+    ys, xs = np.nonzero(np.abs(pixels - np.median(border)) > BACKGROUND_TOLERANCE)
+    if len(xs) == 0:
+        return gray
+    return gray.crop((xs.min(), ys.min(), xs.max() + 1, ys.max() + 1))
+
+
+def dhash(image: Image.Image, size: int = 8) -> int:
+    """Difference hash: is each pixel brighter than its right neighbour?"""
+    small = _subject(image).resize((size + 1, size), Image.LANCZOS)
+    pixels = np.asarray(small, dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+_DCT_CACHE = {}
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    if n not in _DCT_CACHE:
+        k = np.arange(n)[:, None]
+        i = np.arange(n)[None, :]
+        matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+        matrix[0] /= np.sqrt(2.0)
+        _DCT_CACHE[n] = matrix
+    return _DCT_CACHE[n]
+
+
+def phash(image: Image.Image, size: int = 8, scale: int = 4) -> int:
+    """DCT hash: low-frequency coefficients above or below their median."""
+    n = size * scale
+    pixels = np.asarray(_subject(image).resize((n, n), Image.LANCZOS), dtype=np.float64)
+    dct = _dct_matrix(n)
+    low = (dct @ pixels @ dct.T)[:size, :size].reshape(-1)
+    # The DC term only reflects overall brightness; leave it out of the median.
+    return _bits_to_int(low > np.median(low[1:]))
+
+
+def image_hash(path: str, algorithm: str = "dhash") -> int:
+    with Image.open(path) as image:
+        return phash(image) if algorithm == "phash" else dhash(image)
+
+
+def image_hashes(path: str, algorithm: str = "dhash") -> tuple:
+    """Return (primary, confirming) hashes: algorithm, then the other one."""
+    with Image.open(path) as image:
+        image.load()
+        if algorithm == "phash":
+            return phash(image), dhash(image)
+        return dhash(image), phash(image)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance."""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value: int, item):
+        self.size += 1
+        node = [value, item, {}]
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, value: int, max_distance: int) -> list:
+        """Return (distance, item) pairs within max_distance, nearest first."""
+        if self.root is None:
+            return []
+        matches = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                matches.append((distance, node[1]))
+            # Triangle inequality: only subtrees in this band can match.
+            for edge, child in node[2].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        matches.sort(key=lambda m: m[0])
+        return matches
+
+
+class HashIndex:
+    """Persistent perceptual-hash index with BK-tree lookups.
+
+    The BK-tree is keyed on the primary hash; each row also stores the
+    other algorithm's hash to confirm candidates. Rows are only ever
+    appended. Re-adding a key supersedes its earlier hash; superseded tree
+    nodes are filtered out of results. Each lookup first loads rows added by
+    other processes since the last one.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX, algorithm: str = "dhash"):
+        self.algorithm = algorithm
+        self.conn = sqlite3.connect(path, timeout=30.0, isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(hashes)")}
+        if "confirm" not in columns:  # index created before confirming hashes
+            self.conn.execute("ALTER TABLE hashes ADD COLUMN confirm TEXT")
+        self.lock = threading.Lock()
+        self.tree = BKTree()
+        self.current = {}  # key -> (hash, confirming hash or None, path)
+        self.last_id = 0
+
+    def close(self):
+        self.conn.close()
+
+    def _refresh(self):
+        rows = self.conn.execute(
+            "SELECT id, key, path, hash, confirm FROM hashes"
+            " WHERE id > ? AND algorithm = ? ORDER BY id",
+            (self.last_id, self.algorithm),
+        ).fetchall()
+        for row_id, key, path, value, confirm in rows:
+            value = int(value, 16)
+            self.current[key] = (value, int(confirm, 16) if confirm else None, path)
+            self.tree.add(value, (key, value))
+            self.last_id = row_id
+
+    def _find(self, value: int, max_distance: int, exclude_key: str = None,
+              confirm: int = None, confirm_distance: int = None) -> list:
+        matches = []
+        for distance, (key, indexed) in self.tree.search(value, max_distance):
+            current, current_confirm, path = self.current[key]
+            if key == exclude_key or indexed != current:
+                continue
+            if confirm_distance is not None and (
+                    current_confirm is None or hamming(confirm, current_confirm) > confirm_distance):
+                continue
+            matches.append((distance, key, path))
+        return matches
+
+    def __len__(self) -> int:
+        with self.lock:
+            self._refresh()
+            return len(self.current)
+
+    def query(self, value: int, max_distance: int = DEFAULT_DISTANCE, exclude_key: str = None,
+              confirm: int = None, confirm_distance: int = None) -> list:
+        """Return (distance, key, path) for indexed images near value.
+
+        With confirm_distance set, matches must also be within that distance
+        of confirm on the confirming hash.
+        """
+        with self.lock:
+            self._refresh()
+            return self._find(value, max_distance, exclude_key, confirm, confirm_distance)
+
+    def _insert(self, key: str, path: str, value: int, confirm: int = None):
+        self.conn.execute(
+            "INSERT INTO hashes (key, path, algorithm, hash, confirm, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (key, path, self.algorithm, f"{value:016x}",
+             f"{confirm:016x}" if confirm is not None else None, time.time()),
+        )
+
+    def add(self, key: str, path: str, value: int, confirm: int = None):
+        with self.lock:
+            self._insert(key, path, value, confirm)
+            self._refresh()
+
+    def check_and_add(self, key: str, path: str, max_distance: int = DEFAULT_DISTANCE,
+                      confirm_distance: int = DEFAULT_CONFIRM_DISTANCE) -> list:
+        """Hash path, return near-duplicates of other keys, and index it if none.
+
+        A duplicate must be within max_distance on the primary hash and
+        within confirm_distance on the other one (None skips that check).
+        The lookup and insert share one write transaction, so two workers
+        checking near-identical images at the same moment cannot both pass.
+        """
+        value, confirm = image_hashes(path, self.algorithm)
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                matches = self._find(value, max_distance, key, confirm, confirm_distance)
+                if not matches:
+                    self._insert(key, path, value, confirm)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self._refresh()
+        return matches
+
+
+def _iter_images(paths: list):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Maintain a perceptual-hash index and find near-duplicate images.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s scan out/                 # index existing outputs, report duplicates
+  %(prog)s query candidate.png --distance 6 --confirm-distance 8
+  %(prog)s stats
+        """
+    )
+    parser.add_argument("command", choices=["scan", "query", "stats"])
+    parser.add_argument("paths", nargs="*", help="Images or directories")
+    parser.add_argument("--index", default=DEFAULT_INDEX,
+                        help="Index database (default: $ASSET_HASH_INDEX or asset-hashes.db)")
+    parser.add_argument("--algorithm", choices=ALGORITHMS, default="dhash",
+                        help="Hash function (default: %(default)s)")
+    parser.add_argument("--distance", type=int, default=DEFAULT_DISTANCE,
+                        help="Max Hamming distance (of 64 bits) for a duplicate (default: %(default)s)")
+    parser.add_argument("--confirm-distance", type=int, default=DEFAULT_CONFIRM_DISTANCE,
+                        help="Max distance on the other hash to confirm a duplicate "
+                             "(default: %(default)s)")
+    args = parser.parse_args()
+
+    index = HashIndex(args.index, args.algorithm)
+    try:
+        if args.command == "stats":
+            print(f"{len(index)} image(s) indexed with {args.algorithm}")
+        elif args.command == "query":
+            for path in _iter_images(args.paths):
+                value, confirm = image_hashes(path, args.algorithm)
+                matches = index.query(value, args.distance, None, confirm, args.confirm_distance)
+                if not matches:
+                    print(f"{path}: unique")
+                for distance, _, match_path in matches:
+                    print(f"{path}: distance {distance} from {match_path}")
+        else:
+            duplicates = 0
+            for path in _iter_images(args.paths):
+                key = os.path.abspath(path)
+                matches = index.check_and_add(key, key, args.distance, args.confirm_distance)
+                if matches:
+                    duplicates += 1
+                    distance, _, match_path = matches[0]
+                    print(f"Duplicate: {path} ~ {match_path} (distance {distance})")
+            print(f"{len(index)} image(s) indexed, {duplicates} near-duplicate(s) found")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
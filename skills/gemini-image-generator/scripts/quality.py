@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Generation Quality Gate
+Cheap local checks on a generated image before paying for Recraft calls.
+
+Catches the common bad samples from Gemini: images that are too small,
+blank or near-uniform, have no clear subject, sit on a busy background
+(which background removal handles poorly) or have the wrong aspect ratio.
+Whether the image matches its prompt is not checked here.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+from PIL import Image
+
+DEFAULTS = {
+    "min_size": 256,        # shortest side, pixels
+    "min_aspect": 0.5,      # width / height
+    "max_aspect": 2.0,
+    "min_contrast": 6.0,    # luminance standard deviation, 0-255
+    "min_subject": 0.02,    # fraction of pixels that differ from the background
+    "max_subject": 0.95,
+    "min_border": 0.85,     # fraction of border pixels matching the border color
+    "tolerance": 24.0,      # RGB distance counted as "the same color"
+}
+ANALYSIS_SIZE = 256
+
+
+def check_image(path: str, **overrides) -> tuple:
+    """Return (failures, metrics) for an image; an empty failures list passes."""
+    limits = dict(DEFAULTS)
+    limits.update({k: v for k, v in overrides.items() if v is not None})
+
+    image = Image.open(path)
+    width, height = image.size
+    failures = []
+    metrics = {"width": width, "height": height, "aspect": round(width / height, 3)}
+
+    if min(width, height) < limits["min_size"]:
+        failures.append(f"resolution {width}x{height} below {limits['min_size']}px")
+    if not limits["min_aspect"] <= width / height <= limits["max_aspect"]:
+        failures.append(f"aspect ratio {width / height:.2f} outside "
+                        f"{limits['min_aspect']}-{limits['max_aspect']}")
+
+    # The remaining checks are statistical, so a thumbnail is plenty.
+    image = image.convert("RGBA")
+    image.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE))
+    rgba = np.asarray(image, dtype=np.float32)
+    rgb, alpha = rgba[:, :, :3], rgba[:, :, 3]
+
+    luminance = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    contrast = float(luminance[alpha > 0].std()) if (alpha > 0).any() else 0.0
+    metrics["contrast"] = round(contrast, 2)
+    if contrast < limits["min_contrast"]:
+        failures.append(f"near-uniform image (contrast {contrast:.1f})")
+
+    border = np.concatenate([rgb[0], rgb[-1], rgb[1:-1, 0], rgb[1:-1, -1]])
+    border_alpha = np.concatenate([alpha[0], alpha[-1], alpha[1:-1, 0], alpha[1:-1, -1]])
+    if (border_alpha == 0).mean() > 0.5:
+        # Already transparent around the edges: alpha defines the subject.
+        border_score = float((border_alpha == 0).mean())
+        subject = alpha > 0
+    else:
+        background = np.median(border, axis=0)
+        border_score = float(
+            (np.linalg.norm(border - background, axis=1) <= limits["tolerance"]).mean()
+        )
+        subject = np.linalg.norm(rgb - background, axis=2) > limits["tolerance"]
+    subject_fraction = float(subject.mean())
+
+    metrics["border_uniformity"] = round(border_score, 3)
+    metrics["subject_fraction"] = round(subject_fraction, 3)
+    if border_score < limits["min_border"]:
+        failures.append(f"busy border ({border_score:.0%} uniform), background removal "
+                        f"is likely to fail")
+    if subject_fraction < limits["min_subject"]:
+        failures.append(f"no clear subject ({subject_fraction:.1%} of pixels)")
+    elif subject_fraction > limits["max_subject"]:
+        failures.append(f"subject fills the frame ({subject_fraction:.0%} of pixels)")
+
+    return failures, metrics
+
+
+def quarantine(path: str, failures: list, metrics: dict, quarantine_dir: str = None) -> str:
+    """Move a rejected image aside with a JSON report; return its new path."""
+    if quarantine_dir is None:
+        quarantine_dir = os.path.join(os.path.dirname(path), "quarantine")
+    os.makedirs(quarantine_dir, exist_ok=True)
+
+    target = os.path.join(quarantine_dir, os.path.basename(path))
+    shutil.move(path, target)
+    with open(os.path.splitext(target)[0] + ".json", "w", encoding="utf-8") as f:
+        json.dump({"source": path, "failures": failures, "metrics": metrics}, f, indent=2)
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check a generated image before sending it to Recraft.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s --input robot.png
+  %(prog)s --input robot.png --min-size 512 --min-aspect 0.9 --max-aspect 1.1
+  %(prog)s --input robot.png --quarantine rejected/
+        """
+    )
+    parser.add_argument(
+        "--input",
+        required=True,
+        help="Generated image to check"
+    )
+    parser.add_argument("--min-size", type=int, help="Minimum shortest side in pixels")
+    parser.add_argument("--min-aspect", type=float, help="Minimum width/height ratio")
+    parser.add_argument("--max-aspect", type=float, help="Maximum width/height ratio")
+    parser.add_argument(
+        "--quarantine",
+        metavar="DIR",
+        help="Move the image and a JSON report here if it fails"
+    )
+    args = parser.parse_args()
+
+    failures, metrics = check_image(args.input, min_size=args.min_size,
+                                    min_aspect=args.min_aspect, max_aspect=args.max_aspect)
+    print(json.dumps(metrics))
+    if not failures:
+        print(f"Passed: {args.input}")
+        sys.exit(0)
+
+    for failure in failures:
+        print(f"Failed: {failure}", file=sys.stderr)
+    if args.quarantine:
+        target = quarantine(args.input, failures, metrics, args.quarantine)
+        print(f"Quarantined to: {target}")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Palette Quantizer
+Reduce an image to N flat colors before vectorization.
+
+Gemini output is full of soft gradients and noise, which Recraft's vectorizer
+faithfully traces into thousands of tiny paths. Snapping the sprite to a
+small palette (k-means over its opaque pixels) and removing speckles first
+gives much smaller SVGs that browsers rasterize faster.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+DEFAULT_COLORS = 16
+DEFAULT_DESPECKLE = 3
+# Labels are uint8 and the last value marks transparency.
+MIN_COLORS = 2
+MAX_COLORS = 255
+ALPHA_CUTOFF = 128
+SAMPLE_SIZE = 20000
+CHUNK_SIZE = 262144
+
+
+def _nearest(pixels: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Index of the nearest center for each pixel, computed in chunks."""
+    labels = np.empty(len(pixels), dtype=np.intp)
+    for start in range(0, len(pixels), CHUNK_SIZE):
+        chunk = pixels[start:start + CHUNK_SIZE]
+        distances = ((chunk[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels[start:start + CHUNK_SIZE] = distances.argmin(axis=1)
+    return labels
+
+
+def kmeans_palette(pixels: np.ndarray, colors: int, iterations: int = 12,
+                   seed: int = 0) -> np.ndarray:
+    """Fit a palette of up to `colors` RGB centers to an (N, 3) float array."""
+    rng = np.random.default_rng(seed)
+    if len(pixels) > SAMPLE_SIZE:
+        pixels = pixels[rng.choice(len(pixels), SAMPLE_SIZE, replace=False)]
+
+    unique = np.unique(pixels, axis=0)
+    if len(unique) <= colors:
+        return unique
+
+    # k-means++ initialisation
+    centers = [pixels[rng.integers(len(pixels))]]
+    closest = ((pixels - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, colors):
+        total = closest.sum()
+        if total == 0:
+            break
+        centers.append(pixels[rng.choice(len(pixels), p=closest / total)])
+        closest = np.minimum(closest, ((pixels - centers[-1]) ** 2).sum(axis=1))
+    centers = np.array(centers)
+
+    for _ in range(iterations):
+        labels = _nearest(pixels, centers)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, pixels)
+        counts = np.bincount(labels, minlength=len(centers))[:, None]
+        updated = np.where(counts > 0, sums / np.maximum(counts, 1), centers)
+        if np.allclose(updated, centers, atol=0.5):
+            centers = updated
+            break
+        centers = updated
+    return centers
+
+
+def check_colors(colors) -> int:
+    """Return colors if it is a usable palette size, else raise ValueError."""
+    if isinstance(colors, bool) or not isinstance(colors, int) \
+            or not MIN_COLORS <= colors <= MAX_COLORS:
+        raise ValueError(f"colors must be an integer between {MIN_COLORS} and {MAX_COLORS}, "
+                         f"got {colors!r}")
+    return colors
+
+
+def palette_size(value: str) -> int:
+    """argparse type for --colors."""
+    try:
+        return check_colors(int(value))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def quantize_image(input_path: str, output_path: str, colors: int = DEFAULT_COLORS,
+                   despeckle: int = DEFAULT_DESPECKLE) -> bool:
+    """Quantize input to `colors` flat colors with hard alpha and save as PNG."""
+    check_colors(colors)
+    print(f"Quantizing to {colors} colors: {input_path}")
+
+    image = Image.open(input_path)
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    rgba = np.asarray(image)
+    height, width = rgba.shape[:2]
+
+    opaque = rgba[:, :, 3] >= ALPHA_CUTOFF
+    if not opaque.any():
+        print(f"Error: {input_path} has no opaque pixels.", file=sys.stderr)
+        return False
+
+    rgb = rgba[:, :, :3].reshape(-1, 3).astype(np.float32)
+    opaque_flat = opaque.reshape(-1)
+    palette = kmeans_palette(rgb[opaque_flat], colors)
+
+    # Label every pixel; the extra label len(palette) marks transparency.
+    labels = np.full(height * width, len(palette), dtype=np.uint8)
+    labels[opaque_flat] = _nearest(rgb[opaque_flat], palette)
+    labels = labels.reshape(height, width)
+
+    if despeckle > 1:
+        # Majority filter over the label image removes isolated pixels and
+        # one-pixel fringes that would otherwise each become an SVG path.
+        size = despeckle if despeckle % 2 else despeckle + 1
+        labels = np.asarray(Image.fromarray(labels, "L").filter(ImageFilter.ModeFilter(size)))
+
+    lut = np.zeros((256, 4), dtype=np.uint8)
+    lut[:len(palette), :3] = np.clip(np.rint(palette), 0, 255)
+    lut[:len(palette), 3] = 255
+    Image.fromarray(lut[labels], "RGBA").save(output_path, optimize=True)
+
+    print(f"Quantized to {len(palette)} colors, saved to: {output_path}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Quantize an image to a small flat palette before vectorization.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s --input icon-trim.png --output icon-quant.png
+  %(prog)s --input icon-trim.png --output icon-quant.png --colors 8 --despeckle 5
+        """
+    )
+    parser.add_argument(
+        "--input",
+        required=True,
+        help="Input image path"
+    )
+    parser.add_argument(
+        "--output",
+        required=True,
+        help="Output PNG path"
+    )
+    parser.add_argument(
+        "--colors",
+        type=palette_size,
+        default=DEFAULT_COLORS,
+        help="Palette size (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--despeckle",
+        type=int,
+        default=DEFAULT_DESPECKLE,
+        help="Majority filter size in pixels; 0 disables (default: %(default)s)"
+    )
+    args = parser.parse_args()
+
+    output_dir = os.path.dirname(args.output)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    success = quantize_image(args.input, args.output, args.colors, args.despeckle)
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
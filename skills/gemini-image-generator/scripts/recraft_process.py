@@ -6,31 +6,40 @@ Remove backgrounds and vectorize images using Recraft API.
 import argparse
 import os
 import sys
+import tempfile
+import time
 import requests
 
+from cache import content_hash, single_flight
+from concurrency import AIMDController, RateLimited, run_batch, write_metrics
+
 RECRAFT_API_BASE = "https://external.api.recraft.ai/v1"
+REQUEST_TIMEOUT = 120
 
+# One session per process keeps connections to Recraft (and its CDN) alive
+# across calls in long-running tools such as the worker and watch mode.
+SESSION = requests.Session()
 
-def remove_background(input_path: str, output_path: str, api_key: str) -> bool:
-    """Remove background from an image using Recraft API."""
-    print(f"Removing background from: {input_path}")
 
-    url = f"{RECRAFT_API_BASE}/images/removeBackground"
+def _recraft_process(endpoint: str, input_path: str, output_path: str, api_key: str) -> bool:
+    """Upload an image to a Recraft endpoint and download the result."""
+    url = f"{RECRAFT_API_BASE}/images/{endpoint}"
     headers = {"Authorization": f"Bearer {api_key}"}
 
     with open(input_path, "rb") as f:
         files = {"file": (os.path.basename(input_path), f, "image/png")}
-        response = requests.post(url, headers=headers, files=files)
+        response = SESSION.post(url, headers=headers, files=files, timeout=REQUEST_TIMEOUT)
 
+    if response.status_code == 429:
+        raise RateLimited(f"Recraft {endpoint}: {response.text}")
     if response.status_code == 200:
         data = response.json()
         if "image" in data and "url" in data["image"]:
             # Download the processed image
-            img_response = requests.get(data["image"]["url"])
+            img_response = SESSION.get(data["image"]["url"], timeout=REQUEST_TIMEOUT)
             if img_response.status_code == 200:
                 with open(output_path, "wb") as f:
                     f.write(img_response.content)
-                print(f"Background removed, saved to: {output_path}")
                 return True
         print(f"Unexpected response format: {data}")
         return False
@@ -39,32 +48,123 @@ def remove_background(input_path: str, output_path: str, api_key: str) -> bool:
         return False
 
 
+def remove_background(input_path: str, output_path: str, api_key: str) -> bool:
+    """Remove background from an image using Recraft API."""
+    print(f"Removing background from: {input_path}")
+
+    # Identical inputs share one API call (and its cached result).
+    key = content_hash("remove-bg", files=[input_path])
+    success = single_flight(
+        key, output_path,
+        lambda path: _recraft_process("removeBackground", input_path, path, api_key),
+    )
+    if success:
+        print(f"Background removed, saved to: {output_path}")
+    return success
+
+
 def vectorize(input_path: str, output_path: str, api_key: str) -> bool:
     """Vectorize an image using Recraft API."""
     print(f"Vectorizing: {input_path}")
 
-    url = f"{RECRAFT_API_BASE}/images/vectorize"
-    headers = {"Authorization": f"Bearer {api_key}"}
+    key = content_hash("vectorize", files=[input_path])
+    success = single_flight(
+        key, output_path,
+        lambda path: _recraft_process("vectorize", input_path, path, api_key),
+    )
+    if success:
+        print(f"Vectorized, saved to: {output_path}")
+    return success
 
-    with open(input_path, "rb") as f:
-        files = {"file": (os.path.basename(input_path), f, "image/png")}
-        response = requests.post(url, headers=headers, files=files)
 
-    if response.status_code == 200:
-        data = response.json()
-        if "image" in data and "url" in data["image"]:
-            # Download the SVG
-            img_response = requests.get(data["image"]["url"])
-            if img_response.status_code == 200:
-                with open(output_path, "wb") as f:
-                    f.write(img_response.content)
-                print(f"Vectorized, saved to: {output_path}")
-                return True
-        print(f"Unexpected response format: {data}")
-        return False
-    else:
-        print(f"Error: {response.status_code} - {response.text}")
-        return False
+def run_action(action: str, input_path: str, output_path: str, api_key: str,
+               colors: int = None, despeckle: int = 3) -> bool:
+    """Run one action on one image."""
+    if action == "remove-bg":
+        return remove_background(input_path, output_path, api_key)
+    if action == "vectorize" and colors:
+        from quantize import quantize_image
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            quantized = os.path.join(tmp_dir, os.path.basename(input_path))
+            return (quantize_image(input_path, quantized, colors, despeckle)
+                    and vectorize(quantized, output_path, api_key))
+    if action == "vectorize":
+        return vectorize(input_path, output_path, api_key)
+    print(f"Unknown action: {action}")
+    return False
+
+
+def _local_source(asset: dict, action: str) -> str:
+    """Return the image a manifest asset uploads for action.
+
+    Vectorize reads the last file this tool (or generation) produced: the
+    asset's local trim stage is run here, and quantization is left to
+    run_action so that --colors can override the manifest.
+    """
+    from manifest import asset_paths, stage_input
+    from trim import DEFAULT_PADDING, DEFAULT_THRESHOLD, trim_image
+
+    stages = asset["stages"]
+    index = stages.index(action)
+    while index > 0 and stages[index - 1] in ("trim", "quantize"):
+        index -= 1
+    source = stage_input(asset, stages[index])
+    if not source or not os.path.exists(source):
+        print(f"Error: {asset['name']}: input {source} not found; run the earlier stages first",
+              file=sys.stderr)
+        return None
+
+    if "trim" in stages[index:stages.index(action)]:
+        trimmed = asset_paths(asset)["trim"]
+        if not trim_image(source, trimmed, asset.get("trim_threshold", DEFAULT_THRESHOLD),
+                          asset.get("trim_padding", DEFAULT_PADDING)):
+            return None
+        source = trimmed
+    return source
+
+
+def run_manifest(args, api_key: str) -> bool:
+    """Run the action on every manifest asset whose pipeline includes it."""
+    from manifest import asset_paths, duplicate_marker, load_manifest
+
+    jobs = []
+    skipped = 0
+    for asset in load_manifest(args.manifest):
+        if args.action not in asset["stages"]:
+            continue
+        marker = duplicate_marker(asset)
+        if os.path.exists(marker):
+            print(f"Skipping {asset['name']}: near-duplicate (see {marker})")
+            continue
+        input_path = _local_source(asset, args.action)
+        if input_path is None:
+            skipped += 1
+            continue
+        output_path = asset_paths(asset)[args.action]
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        # --colors/--despeckle override the manifest's own settings.
+        colors = args.colors or asset.get("colors")
+        despeckle = args.despeckle if args.colors else asset.get("despeckle", args.despeckle)
+        jobs.append((input_path, output_path, colors, despeckle))
+
+    controller = AIMDController(args.concurrency, maximum=args.max_concurrency)
+    started = time.time()
+    results = run_batch(
+        jobs, lambda job: run_action(args.action, job[0], job[1], api_key, job[2], job[3]),
+        controller
+    )
+
+    succeeded = sum(1 for r in results if r)
+    total = len(jobs) + skipped
+    elapsed = time.time() - started
+    print(f"Processed {succeeded}/{total} images in {elapsed:.1f}s "
+          f"(final concurrency {controller.snapshot()['window']})")
+    if args.metrics:
+        write_metrics(args.metrics, controller,
+                      {"action": args.action, "images": total,
+                       "succeeded_images": succeeded, "elapsed": round(elapsed, 2)})
+    return succeeded == total
 
 
 def main():
@@ -75,6 +175,8 @@ def main():
 Examples:
   %(prog)s --action remove-bg --input image.png --output nobg.png
   %(prog)s --action vectorize --input nobg.png --output vector.svg
+  %(prog)s --action vectorize --input nobg.png --output vector.svg --colors 8
+  %(prog)s --action remove-bg --manifest assets.json --metrics metrics.json
         """
     )
     parser.add_argument(
@@ -85,32 +187,73 @@ Examples:
     )
     parser.add_argument(
         "--input",
-        required=True,
         help="Input image path"
     )
     parser.add_argument(
         "--output",
-        required=True,
         help="Output file path"
     )
+    parser.add_argument(
+        "--colors",
+        type=int,
+        help="vectorize: quantize to this many flat colors locally before upload"
+    )
+    parser.add_argument(
+        "--despeckle",
+        type=int,
+        default=3,
+        help="vectorize: speckle filter size used with --colors, 0 disables (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--manifest",
+        help="Batch mode: process every asset in this manifest instead of --input/--output"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Batch mode: initial number of requests in flight (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=32,
+        help="Batch mode: upper bound for the adaptive window (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--metrics",
+        help="Batch mode: write concurrency metrics as JSON to this path ('-' for stdout)"
+    )
     args = parser.parse_args()
 
+    if not args.manifest and not (args.input and args.output):
+        parser.error("--input and --output are required unless --manifest is given")
+    if args.colors is not None:
+        from quantize import check_colors
+
+        try:
+            check_colors(args.colors)
+        except ValueError as e:
+            parser.error(str(e))
+
     api_key = os.environ.get("RECRAFT_API_KEY")
     if not api_key:
         print("Error: RECRAFT_API_KEY environment variable not set.", file=sys.stderr)
         sys.exit(1)
 
+    if args.manifest:
+        sys.exit(0 if run_manifest(args, api_key) else 1)
+
     # Create output directory if needed
     output_dir = os.path.dirname(args.output)
     if output_dir and not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    if args.action == "remove-bg":
-        success = remove_background(args.input, args.output, api_key)
-    elif args.action == "vectorize":
-        success = vectorize(args.input, args.output, api_key)
-    else:
-        print(f"Unknown action: {args.action}")
+    try:
+        success = run_action(args.action, args.input, args.output, api_key,
+                             args.colors, args.despeckle)
+    except (RateLimited, requests.RequestException) as e:
+        print(f"Error: {e}", file=sys.stderr)
         success = False
 
     sys.exit(0 if success else 1)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Gemini Batch Generation - Mock Server Test
+Runs batch_generate.py's submit/poll/fetch against a local mock of the
+Gemini batch endpoints. No API key or network access is needed.
+
+In the first job only, the mock answers prompts containing BLOCK with a
+blocked response (no candidates) and prompts containing ERROR with a
+per-request error, so a second submit can retry them.
+"""
+import base64
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from types import SimpleNamespace
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from batch_generate import poll, submit  # noqa: E402
+from generate import create_client, save_response_image  # noqa: E402
+from jobqueue import JobQueue  # noqa: E402
+from manifest import load_manifest  # noqa: E402
+
+GREEN = "\033[92m"
+RED = "\033[91m"
+RESET = "\033[0m"
+
+
+def _png() -> str:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), "red").save(buffer, "PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+class MockBatchHandler(BaseHTTPRequestHandler):
+    """Batch create (POST) and get (GET); jobs finish on the second get."""
+
+    jobs = {}
+    image = _png()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        requests = body["batch"]["inputConfig"]["requests"]["requests"]
+        name = f"batches/mock{len(self.jobs) + 1}"
+        self.jobs[name] = {"requests": requests, "polls": 0}
+        self._send({"name": name, "metadata": {"name": name, "state": "BATCH_STATE_PENDING"}})
+
+    def _result(self, entry: dict, first_job: bool) -> dict:
+        prompt = entry["request"]["contents"][0]["parts"][0]["text"]
+        result = {"metadata": entry.get("metadata")}
+        if first_job and "ERROR" in prompt:
+            result["error"] = {"code": 400, "message": "mock request error"}
+        elif first_job and "BLOCK" in prompt:
+            result["response"] = {"promptFeedback": {"blockReason": "SAFETY"}}
+        else:
+            part = {"inlineData": {"mimeType": "image/png", "data": self.image}}
+            result["response"] = {"candidates": [{"content": {"role": "model", "parts": [part]}}]}
+        return result
+
+    def do_GET(self):
+        name = self.path.split("/v1beta/")[1].split("?")[0]
+        job = self.jobs[name]
+        job["polls"] += 1
+        if job["polls"] < 2:
+            self._send({"name": name, "metadata": {"name": name, "state": "BATCH_STATE_RUNNING"}})
+            return
+        first_job = name == "batches/mock1"
+        responses = {"inlinedResponses": [self._result(r, first_job) for r in job["requests"]]}
+        self._send({
+            "name": name,
+            "metadata": {"name": name, "state": "BATCH_STATE_SUCCEEDED",
+                         "output": {"inlinedResponses": responses}},
+            "done": True,
+            "response": {"inlinedResponses": responses},
+        })
+
+
+def check(results: list, condition: bool, description: str):
+    mark = f"{GREEN}✓{RESET}" if condition else f"{RED}✗{RESET}"
+    print(f"  {mark} {description}")
+    results.append(condition)
+
+
+def main():
+    server = HTTPServer(("127.0.0.1", 0), MockBatchHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    results = []
+
+    check(results, save_response_image(SimpleNamespace(candidates=None), "unused.png") is False,
+          "save_response_image() returns False for a response without candidates")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manifest_path = os.path.join(tmp, "assets.json")
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump({"output_dir": "out", "assets": [
+                {"name": "coin", "prompt": "Gold coin"},
+                {"name": "gem", "prompt": "Blue gem"},
+                {"name": "blocked", "prompt": "BLOCK this"},
+                {"name": "broken", "prompt": "ERROR please"},
+            ]}, f)
+        assets = load_manifest(manifest_path)
+        by_name = {a["name"]: a for a in assets}
+        state_file = os.path.join(tmp, "assets.batch.json")
+        queue_db = os.path.join(tmp, "queue.db")
+        state = {"model": "mock-model", "jobs": []}
+        client = create_client("test-key", base_url)
+
+        check(results, submit(client, assets, state, state_file, False) == 1,
+              "submit() packs all assets into one job")
+        check(results, poll(client, by_name, state, state_file, 0.01, 0.05, queue_db) is False,
+              "poll() reports failure while any asset is not saved")
+        out = os.path.join(tmp, "out")
+        check(results, all(os.path.exists(os.path.join(out, f"{n}.png")) for n in ("coin", "gem")),
+              "poll() saves successful results")
+        check(results, not os.path.exists(os.path.join(out, "blocked.png"))
+              and not os.path.exists(os.path.join(out, "broken.png")),
+              "blocked and failed results are reported, not saved")
+        check(results, state["jobs"][0]["fetched"] and sorted(state["jobs"][0]["saved"]) == ["coin", "gem"],
+              "job is marked fetched with its saved assets")
+
+        # Simulate a resume after a crash before the state file was updated.
+        mtime = os.path.getmtime(os.path.join(out, "coin.png"))
+        state["jobs"][0]["fetched"] = False
+        MockBatchHandler.jobs[state["jobs"][0]["name"]]["polls"] = 5
+        poll(client, by_name, state, state_file, 0.01, 0.05, queue_db)
+        check(results, os.path.getmtime(os.path.join(out, "coin.png")) == mtime,
+              "a resumed poll does not rewrite saved images")
+
+        queue = JobQueue(queue_db)
+        counts = queue.counts()
+        queue.close()
+        check(results, [tuple(r) for r in counts] == [("gate", "queued", 2)],
+              "--queue enqueues each saved asset's next stage exactly once")
+
+        check(results, submit(client, assets, state, state_file, False) == 1
+              and sorted(state["jobs"][-1]["assets"]) == ["blocked", "broken"],
+              "a second submit retries only the blocked and failed assets")
+        check(results, poll(client, by_name, state, state_file, 0.01, 0.05, queue_db) is True,
+              "poll() succeeds once every asset is saved")
+        check(results, all(os.path.exists(os.path.join(out, f"{n}.png"))
+                           for n in ("blocked", "broken")),
+              "retried assets are saved")
+        check(results, submit(client, assets, state, state_file, False) == 0,
+              "nothing is resubmitted once every asset is saved")
+
+    server.shutdown()
+    passed = sum(results)
+    print(f"\n{passed}/{len(results)} checks passed")
+    sys.exit(0 if passed == len(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
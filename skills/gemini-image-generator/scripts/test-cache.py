@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Content-Addressed Result Cache - Tests
+Checks that single_flight() coalesces identical calls across threads and
+processes, and that non-persistent (generation) results are never reused
+by a later call. Uses a temporary cache directory.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Child processes inherit the parent's temporary cache directory.
+CACHE_DIR = os.environ.get("ASSET_CACHE_TEST_DIR") or tempfile.mkdtemp(prefix="asset-cache-test-")
+os.environ["ASSET_CACHE_TEST_DIR"] = os.environ["ASSET_CACHE_DIR"] = CACHE_DIR
+os.environ["ASSET_CACHE"] = "on"
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cache import _blob_path, _read_state, content_hash, single_flight  # noqa: E402
+
+GREEN = "\033[92m"
+RED = "\033[91m"
+RESET = "\033[0m"
+
+
+def check(results: list, condition: bool, description: str):
+    mark = f"{GREEN}✓{RESET}" if condition else f"{RED}✗{RESET}"
+    print(f"  {mark} {description}")
+    results.append(condition)
+
+
+def producer(calls_file: str, seconds: float):
+    """A produce() that logs each real call and takes a while."""
+    def produce(path):
+        with open(calls_file, "a", encoding="utf-8") as f:
+            f.write(f"{os.getpid()}\n")
+        time.sleep(seconds)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"result from {os.getpid()} at {time.time()}")
+        return True
+    return produce
+
+
+def call_count(calls_file: str) -> int:
+    if not os.path.exists(calls_file):
+        return 0
+    with open(calls_file, "r", encoding="utf-8") as f:
+        return len(f.read().split())
+
+
+def child(key: str, output_path: str, calls_file: str, persistent: str):
+    ok = single_flight(key, output_path, producer(calls_file, 1.0), persistent == "1")
+    sys.exit(0 if ok else 1)
+
+
+def run_threads(key: str, tmp: str, name: str, calls_file: str, persistent: bool) -> list:
+    outputs = [os.path.join(tmp, f"{name}-{i}.txt") for i in range(5)]
+    threads = [threading.Thread(target=single_flight,
+                                args=(key, path, producer(calls_file, 0.3), persistent))
+               for path in outputs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outputs
+
+
+def main():
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        calls = os.path.join(tmp, "persistent.calls")
+        key = content_hash("remove-bg", "test", time.time())
+        outputs = run_threads(key, tmp, "persistent", calls, True)
+        check(results, call_count(calls) == 1 and all(os.path.exists(p) for p in outputs),
+              "concurrent threads share one call")
+        single_flight(key, os.path.join(tmp, "later.txt"), producer(calls, 0), True)
+        check(results, call_count(calls) == 1, "a persistent result is reused by a later call")
+
+        calls = os.path.join(tmp, "fresh.calls")
+        key = content_hash("generate", "test", time.time())
+        outputs = run_threads(key, tmp, "fresh", calls, False)
+        check(results, call_count(calls) == 1, "concurrent generation calls are coalesced")
+        single_flight(key, os.path.join(tmp, "again.txt"), producer(calls, 0), False)
+        with open(outputs[0], "r", encoding="utf-8") as f, \
+                open(os.path.join(tmp, "again.txt"), "r", encoding="utf-8") as g:
+            fresh = f.read() != g.read()
+        check(results, call_count(calls) == 2 and fresh,
+              "a later generation call produces a fresh result")
+
+        # Across processes: start a leader, wait until it is producing, then
+        # start three followers that must wait for it and take its result.
+        calls = os.path.join(tmp, "process.calls")
+        key = content_hash("generate", "process", time.time())
+        lock_path = _blob_path(key) + ".lock"
+
+        def spawn(index):
+            return subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child", key,
+                                     os.path.join(tmp, f"process-{index}.txt"), calls, "0"])
+
+        processes = [spawn(0)]
+        deadline = time.time() + 10
+        while time.time() < deadline and not _read_state(lock_path).startswith("running "):
+            time.sleep(0.01)
+        processes += [spawn(i) for i in range(1, 4)]
+        codes = [p.wait() for p in processes]
+        check(results, codes == [0, 0, 0, 0] and call_count(calls) == 1,
+              "processes that arrive mid-flight wait for the leader's result")
+        check(results, subprocess.call([sys.executable, os.path.abspath(__file__), "--child", key,
+                                        os.path.join(tmp, "process-late.txt"), calls, "0"]) == 0
+              and call_count(calls) == 2,
+              "a process arriving after the flight makes a fresh call")
+
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+    passed = sum(results)
+    print(f"\n{passed}/{len(results)} checks passed")
+    sys.exit(0 if passed == len(results) else 1)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 6 and sys.argv[1] == "--child":
+        child(*sys.argv[2:])
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Adaptive Concurrency - Tests
+Feeds AIMDController synthetic outcomes and latencies and checks its
+window decisions. No API calls are made.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from concurrency import AIMDController  # noqa: E402
+
+GREEN = "\033[92m"
+RED = "\033[91m"
+RESET = "\033[0m"
+
+
+def check(results: list, condition: bool, description: str):
+    mark = f"{GREEN}✓{RESET}" if condition else f"{RED}✗{RESET}"
+    print(f"  {mark} {description}")
+    results.append(condition)
+
+
+def finish(controller: AIMDController, outcome: str, latency: float = 1.0):
+    """Record one request that took `latency` seconds."""
+    started = controller.acquire()
+    controller.release(started - latency, outcome)
+
+
+def main():
+    results = []
+
+    controller = AIMDController(initial=8, maximum=16)
+    for _ in range(30):
+        finish(controller, "ok")
+    check(results, int(controller.window) == 11,
+          "healthy responses grow the window by one per window's worth")
+    finish(controller, "throttled")
+    check(results, int(controller.window) == 5, "a 429 halves the window")
+    started = controller.acquire()
+    finish(controller, "timeout", latency=0)
+    controller.release(started - 1.0, "throttled")
+    check(results, int(controller.window) == 2,
+          "a request started before the last decrease does not shrink it again")
+    finish(controller, "error")
+    check(results, int(controller.window) == 2, "plain errors leave the window alone")
+
+    controller = AIMDController(initial=8, maximum=16)
+    for _ in range(20):
+        finish(controller, "ok", latency=1.0)
+    before = int(controller.window)
+    finish(controller, "ok", latency=5.0)
+    check(results, int(controller.window) == before // 2, "a latency spike halves the window")
+
+    # Latency settles at a new, higher level: the controller must re-learn it.
+    controller = AIMDController(initial=8, maximum=16)
+    for _ in range(20):
+        finish(controller, "ok", latency=1.0)
+        time.sleep(0.001)
+    for _ in range(200):
+        finish(controller, "ok", latency=3.0)
+        time.sleep(0.001)
+    spikes = controller.counts["spikes"]
+    check(results, spikes <= 2, f"a lasting latency shift only counts as a spike briefly ({spikes})")
+    check(results, controller.decisions[-1]["action"] == "increase"
+          and int(controller.window) > controller.minimum,
+          f"the window grows again after the shift (now {int(controller.window)})")
+
+    passed = sum(results)
+    print(f"\n{passed}/{len(results)} checks passed")
+    sys.exit(0 if passed == len(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Asset Job Queue - Tests
+Checks leasing, lease recovery, retry backoff and attempt limits against a
+temporary queue database.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from jobqueue import JobQueue  # noqa: E402
+
+GREEN = "\033[92m"
+RED = "\033[91m"
+RESET = "\033[0m"
+
+
+def check(results: list, condition: bool, description: str):
+    mark = f"{GREEN}✓{RESET}" if condition else f"{RED}✗{RESET}"
+    print(f"  {mark} {description}")
+    results.append(condition)
+
+
+def job_row(queue: JobQueue, job_id: int) -> dict:
+    return dict(queue.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+
+def main():
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = JobQueue(os.path.join(tmp, "queue.db"))
+
+        low = queue.enqueue("coin", "generate", {"name": "coin"})
+        high = queue.enqueue("gem", "generate", {"name": "gem"}, priority=5)
+        check(results, queue.enqueue("coin", "generate", {}, unique=True) == low,
+              "a unique enqueue reuses the queued job")
+        job = queue.claim("worker-a")
+        check(results, job["id"] == high and job["payload"] == {"name": "gem"},
+              "claim() leases the highest-priority job first")
+        check(results, queue.complete(high, "worker-a", [("gem", "gate", {"name": "gem"}, 5)]),
+              "complete() succeeds for the lease owner")
+        gate = queue.claim("worker-a", stages=["gate"])
+        check(results, gate["asset"] == "gem", "complete() enqueues the follow-up job")
+        queue.complete(gate["id"], "worker-a")
+
+        # Lease recovery: a worker that stops renewing loses its job.
+        job = queue.claim("worker-a", lease=0.05, stages=["generate"])
+        check(results, job["id"] == low, "claim() respects the stages filter")
+        check(results, queue.claim("worker-b", stages=["generate"]) is None,
+              "a leased job is not claimed twice")
+        time.sleep(0.1)
+        job = queue.claim("worker-b", stages=["generate"])
+        check(results, job is not None and job["id"] == low and job["attempts"] == 2,
+              "an expired lease returns the job to another worker")
+        check(results, not queue.renew(low, "worker-a") and not queue.complete(low, "worker-a"),
+              "the previous owner can neither renew nor complete it")
+        check(results, queue.complete(low, "worker-b"), "the new owner completes it")
+
+        # Backoff: each failed attempt waits twice as long as the last.
+        flaky = queue.enqueue("flaky", "remove-bg", {}, max_attempts=3)
+        delays = []
+        for _ in range(2):
+            job = None
+            while job is None:
+                job = queue.claim("worker-a", stages=["remove-bg"])
+            before = time.time()
+            queue.fail(flaky, "worker-a", "HTTP 503", retry_delay=0.05)
+            delays.append(job_row(queue, flaky)["available_at"] - before)
+        check(results, 0.05 <= delays[0] < 0.08 and 0.1 <= delays[1] < 0.13,
+              f"fail() backs off exponentially ({delays[0]:.3f}s, {delays[1]:.3f}s)")
+        check(results, queue.claim("worker-a", stages=["remove-bg"]) is None,
+              "a job is not claimed before its backoff ends")
+
+        # Exhausted attempts: the third failure is final.
+        time.sleep(0.12)
+        queue.claim("worker-a", stages=["remove-bg"])
+        queue.fail(flaky, "worker-a", "HTTP 503", retry_delay=0.05)
+        row = job_row(queue, flaky)
+        check(results, row["state"] == "failed" and row["last_error"] == "HTTP 503",
+              "a job that uses up its attempts is marked failed")
+
+        expired = queue.enqueue("stuck", "trim", {}, max_attempts=1)
+        queue.claim("worker-a", lease=0.01, stages=["trim"])
+        time.sleep(0.05)
+        check(results, queue.claim("worker-b", stages=["trim"]) is None
+              and job_row(queue, expired)["state"] == "failed",
+              "an expired lease on the last attempt fails the job")
+
+        check(results, queue.retry_failed() == 2 and queue.pending() == 2,
+              "retry_failed() requeues failed jobs")
+        job = queue.claim("worker-a", stages=["remove-bg"])
+        check(results, job is not None and job["attempts"] == 1,
+              "a retried job starts with a fresh attempt budget")
+        queue.close()
+
+    passed = sum(results)
+    print(f"\n{passed}/{len(results)} checks passed")
+    sys.exit(0 if passed == len(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Perceptual Hash Index - Tests
+Checks BK-tree search against brute force and that the index flags
+re-encodes of an image without flagging distinct icons.
+"""
+import math
+import os
+import random
+import sys
+import tempfile
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from phash import BKTree, HashIndex, hamming  # noqa: E402
+
+GREEN = "\033[92m"
+RED = "\033[91m"
+RESET = "\033[0m"
+
+GOLD = (232, 184, 40)
+
+
+def check(results: list, condition: bool, description: str):
+    mark = f"{GREEN}✓{RESET}" if condition else f"{RED}✗{RESET}"
+    print(f"  {mark} {description}")
+    results.append(condition)
+
+
+def icon(shape: str, size: int = 1024, radius: int = 120) -> Image.Image:
+    """A small gold coin, star or gem centred on a white canvas."""
+    image = Image.new("RGB", (size, size), "white")
+    draw = ImageDraw.Draw(image)
+    c = size // 2
+    if shape == "coin":
+        draw.ellipse((c - radius, c - radius, c + radius, c + radius), fill=GOLD,
+                     outline=(150, 110, 20), width=8)
+        # Off-centre shine: a perfectly symmetric disc has almost no DCT structure.
+        draw.ellipse((c - radius // 2, c - radius // 2, c - radius // 8, c - radius // 8),
+                     fill=(255, 236, 160))
+    elif shape == "gem":
+        draw.polygon([(c, c - radius), (c + radius, c), (c, c + radius), (c - radius // 2, c)],
+                     fill=GOLD, outline=(150, 110, 20))
+    else:
+        points = []
+        for i in range(10):
+            r = radius if i % 2 == 0 else radius * 0.45
+            angle = math.pi / 2 + i * math.pi / 5
+            points.append((c + r * math.cos(angle), c - r * math.sin(angle)))
+        draw.polygon(points, fill=GOLD, outline=(150, 110, 20))
+    return image
+
+
+def main():
+    results = []
+    rng = random.Random(7)
+
+    values = [rng.getrandbits(64) for _ in range(2000)]
+    tree = BKTree()
+    for i, value in enumerate(values):
+        tree.add(value, i)
+    probe = values[123] ^ 0b1011  # three bits away from an indexed value
+    expected = sorted(i for i, v in enumerate(values) if hamming(probe, v) <= 20)
+    found = sorted(i for _, i in tree.search(probe, 20))
+    check(results, found == expected and 123 in found,
+          "BK-tree search returns exactly the brute-force matches")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        coin = os.path.join(tmp, "coin.png")
+        star = os.path.join(tmp, "star.png")
+        gem = os.path.join(tmp, "gem.png")
+        resaved = os.path.join(tmp, "coin-resaved.jpg")
+        icon("coin").save(coin)
+        icon("star").save(star)
+        icon("gem").save(gem)
+        icon("coin").save(resaved, quality=70)
+
+        index = HashIndex(os.path.join(tmp, "hashes.db"))
+        check(results, index.check_and_add("coin", coin) == [],
+              "first image is indexed without matches")
+        check(results, index.check_and_add("star", star) == [],
+              "a gold star is not flagged as a duplicate of a gold coin")
+        matches = index.check_and_add("resaved", resaved)
+        check(results, [m[1] for m in matches] == ["coin"],
+              "a JPEG re-encode of the coin is flagged")
+        check(results, len(index) == 2, "a flagged image is not indexed")
+
+        # Re-adding a key replaces its hash: "coin" now holds the gem.
+        index.check_and_add("coin", gem)
+        check(results, index.check_and_add("resaved-again", resaved) == [],
+              "a superseded hash no longer matches")
+        index.close()
+
+    passed = sum(results)
+    print(f"\n{passed}/{len(results)} checks passed")
+    sys.exit(0 if passed == len(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
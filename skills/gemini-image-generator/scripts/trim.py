@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Transparent Margin Trimmer
+Crop a background-removed sprite to its visible pixels.
+
+Writes the cropped PNG plus a JSON sidecar recording where the crop sat in
+the original canvas, so the game can place the trimmed sprite exactly where
+the untrimmed one would have been.
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_THRESHOLD = 0
+DEFAULT_PADDING = 2
+
+
+def alpha_bbox(alpha: np.ndarray, threshold: int = DEFAULT_THRESHOLD):
+    """Return (left, top, right, bottom) of pixels with alpha > threshold, or None."""
+    mask = alpha > threshold
+    rows = np.flatnonzero(mask.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(mask.any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def sidecar_path(output_path: str) -> str:
+    return os.path.splitext(output_path)[0] + ".json"
+
+
+def trim_image(input_path: str, output_path: str, threshold: int = DEFAULT_THRESHOLD,
+               padding: int = DEFAULT_PADDING) -> bool:
+    """Crop input to its alpha bounding box (plus padding) and write a sidecar."""
+    print(f"Trimming: {input_path}")
+
+    image = Image.open(input_path)
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    width, height = image.size
+
+    bbox = alpha_bbox(np.asarray(image)[:, :, 3], threshold)
+    if bbox is None:
+        print(f"Error: {input_path} has no pixels above alpha {threshold}.", file=sys.stderr)
+        return False
+
+    left, top, right, bottom = bbox
+    left = max(0, left - padding)
+    top = max(0, top - padding)
+    right = min(width, right + padding)
+    bottom = min(height, bottom + padding)
+
+    image.crop((left, top, right, bottom)).save(output_path)
+
+    placement = {
+        "source_width": width,
+        "source_height": height,
+        "offset_x": left,
+        "offset_y": top,
+        "width": right - left,
+        "height": bottom - top,
+    }
+    with open(sidecar_path(output_path), "w", encoding="utf-8") as f:
+        json.dump(placement, f, indent=2)
+
+    print(f"Trimmed {width}x{height} → {right - left}x{bottom - top} "
+          f"at ({left}, {top}), saved to: {output_path}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Crop transparent margins from a sprite and record its original placement.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s --input robot-nobg.png --output robot-trim.png
+  %(prog)s --input robot-nobg.png --output robot-trim.png --threshold 8 --padding 4
+        """
+    )
+    parser.add_argument(
+        "--input",
+        required=True,
+        help="Input PNG with transparency"
+    )
+    parser.add_argument(
+        "--output",
+        required=True,
+        help="Output PNG path (sidecar is written next to it as .json)"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=int,
+        default=DEFAULT_THRESHOLD,
+        help="Alpha values at or below this count as empty (0-255, default: %(default)s)"
+    )
+    parser.add_argument(
+        "--padding",
+        type=int,
+        default=DEFAULT_PADDING,
+        help="Transparent pixels to keep around the sprite (default: %(default)s)"
+    )
+    args = parser.parse_args()
+
+    output_dir = os.path.dirname(args.output)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    success = trim_image(args.input, args.output, args.threshold, args.padding)
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Asset Watch Mode
+Rebuild assets when their prompt files, reference or input images, or manifest change.
+
+File events come from watchdog (inotify on Linux). Bursts of events, such as
+an editor's save-and-rename or a batch of reference exports, are coalesced
+with a debounce before anything runs. Only the assets whose inputs changed are
+rebuilt, using a Gemini client and Recraft session that stay warm between
+rebuilds.
+"""
+import argparse
+import os
+import queue
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from manifest import load_manifest, stage_input
+from worker import StageRunner, dedupe_asset, gate_asset, next_stage
+
+# Manifest keys that only affect a later stage; changing one of these reruns
+# the pipeline from that stage instead of regenerating. Any other change
+# (prompt, reference, input, paths) starts from the beginning.
+STAGE_KEYS = {
+    "gate": ("gate", "max_regenerations"),
+    "dedupe": ("dedupe",),
+    "trim": ("trim_threshold", "trim_padding"),
+    "quantize": ("colors", "despeckle"),
+}
+# Stages that run locally on an earlier stage's output. Adding or removing
+# one reruns from that point; any other change to "stages" starts over.
+LOCAL_STAGES = ("gate", "dedupe", "trim", "quantize")
+
+
+class _ChangeHandler(FileSystemEventHandler):
+    def __init__(self, changes: queue.Queue):
+        self.changes = changes
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        self.changes.put(os.path.abspath(event.src_path))
+        # Editors often save by writing a temp file and renaming it over the original.
+        dest = getattr(event, "dest_path", None)
+        if dest:
+            self.changes.put(os.path.abspath(dest))
+
+
+def source_files(manifest_path: str, assets: list) -> set:
+    """Every file whose change should trigger a rebuild."""
+    files = {os.path.abspath(manifest_path)}
+    for asset in assets:
+        for key in ("prompt_file", "reference", "input"):
+            if asset.get(key):
+                files.add(os.path.abspath(asset[key]))
+    return files
+
+
+def _stage_changes(old_stages: list, new_stages: list) -> list:
+    """Stages of new_stages made dirty by a change to the stage list.
+
+    Dropping stages from the end dirties nothing. Otherwise returns None if
+    a remote stage was added, removed or moved, else the first stage that
+    differs from the old list: an added stage, or the one that now follows
+    a removed stage.
+    """
+    def remote(stages):
+        return [stage for stage in stages if stage not in LOCAL_STAGES]
+
+    if new_stages == old_stages[:len(new_stages)]:
+        return []
+    if remote(old_stages) != remote(new_stages):
+        return None
+    for index, stage in enumerate(new_stages):
+        if index >= len(old_stages) or old_stages[index] != stage:
+            return [stage]
+    return []
+
+
+def first_dirty_stage(old: dict, new: dict, changed: set) -> str:
+    """Return the earliest stage of new that must rerun, or None if unchanged."""
+    first = new["stages"][0]
+    sources = [new.get(key) for key in ("reference", "input")]
+    if old is None or any(path and os.path.abspath(path) in changed for path in sources):
+        return first
+    if old == new:
+        return None
+
+    # "stages" is derived from colors, gate and dedupe unless set explicitly,
+    # so compare it by what was added or removed rather than as a raw value.
+    dirty = _stage_changes(old["stages"], new["stages"])
+    if dirty is None:
+        return first
+    diff = {k for k in set(old) | set(new) if k != "stages" and old.get(k) != new.get(k)}
+    for stage, keys in STAGE_KEYS.items():
+        if diff & set(keys):
+            diff -= set(keys)
+            dirty.append(stage)
+    if diff:
+        return first
+
+    for stage in new["stages"]:
+        if stage in dirty or (stage == "vectorize" and "quantize" in dirty):
+            # Only resume mid-pipeline if the stage's input is still on disk.
+            source = stage_input(new, stage)
+            return stage if source is None or os.path.exists(source) else first
+    return None
+
+
+def affected_assets(old: dict, new: dict, changed: set) -> list:
+    """(asset, start stage) for every asset whose inputs changed."""
+    affected = []
+    for name, asset in new.items():
+        start = first_dirty_stage(old.get(name), asset, changed)
+        if start:
+            affected.append((asset, start))
+    return affected
+
+
+def build_asset(runner: StageRunner, asset: dict, start: str = None) -> bool:
+    """Run an asset's stages from start, following gate regenerations."""
+    stage = start or asset["stages"][0]
+    while stage:
+        if stage == "gate":
+            follow_up = gate_asset(asset)
+            if not follow_up:
+                # The image passed as the last stage, or it failed: quarantined,
+                # or an "input" file that was left in place.
+                return next_stage(asset, "gate") is None and os.path.exists(
+                    stage_input(asset, "gate"))
+            _, stage, asset, _ = follow_up[0]
+            continue
+        if stage == "dedupe":
+            follow_up = dedupe_asset(asset, runner)
+            if not follow_up:
+                return True  # last stage, or a duplicate that needs no processing
+            _, stage, asset, _ = follow_up[0]
+            continue
+        if not runner.run(stage, asset):
+            return False
+        stage = next_stage(asset, stage)
+    return True
+
+
+def rebuild(runner: StageRunner, targets: list, jobs: int):
+    def timed(target):
+        asset, start = target
+        started = time.time()
+        try:
+            ok = build_asset(runner, asset, start)
+        except Exception as e:
+            print(f"Error building {asset['name']}: {e}", file=sys.stderr)
+            ok = False
+        status = "Rebuilt" if ok else "Failed"
+        print(f"{status} {asset['name']} in {time.time() - started:.1f}s")
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        list(pool.map(timed, targets))
+
+
+def watch(manifest_path: str, debounce: float, jobs: int, initial: bool):
+    assets = {a["name"]: a for a in load_manifest(manifest_path)}
+    runner = StageRunner()
+    runner.gemini()  # fail fast on a missing key, and warm the client
+
+    changes = queue.Queue()
+    observer = Observer()
+    handler = _ChangeHandler(changes)
+    watched_dirs = set()
+
+    def watch_sources():
+        for path in source_files(manifest_path, assets.values()):
+            directory = os.path.dirname(path)
+            if directory not in watched_dirs and os.path.isdir(directory):
+                observer.schedule(handler, directory, recursive=False)
+                watched_dirs.add(directory)
+
+    watch_sources()
+    observer.start()
+    print(f"Watching {len(assets)} asset(s) from {manifest_path} (Ctrl+C to stop)")
+
+    if initial:
+        rebuild(runner, [(a, None) for a in assets.values()], jobs)
+
+    try:
+        while True:
+            # Wait for a change, then keep collecting until things go quiet.
+            changed = {changes.get()}
+            while True:
+                try:
+                    changed.add(changes.get(timeout=debounce))
+                except queue.Empty:
+                    break
+
+            changed &= source_files(manifest_path, assets.values())
+            if not changed:
+                continue
+
+            try:
+                latest = {a["name"]: a for a in load_manifest(manifest_path)}
+            except (OSError, ValueError) as e:
+                print(f"Error reloading manifest (keeping previous version): {e}",
+                      file=sys.stderr)
+                continue
+
+            affected = affected_assets(assets, latest, changed)
+            assets = latest
+            watch_sources()
+            if affected:
+                print("Change detected, rebuilding: "
+                      + ", ".join(f"{a['name']} (from {start})" for a, start in affected))
+                rebuild(runner, affected, jobs)
+    except KeyboardInterrupt:
+        print("Stopping watch.")
+    finally:
+        observer.stop()
+        observer.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Watch asset sources and rebuild changed assets automatically.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s --manifest assets.json
+  %(prog)s --manifest assets.json --initial --debounce 1.0
+        """
+    )
+    parser.add_argument(
+        "--manifest",
+        required=True,
+        help="Asset manifest to watch (see manifest.py)"
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.5,
+        help="Seconds of quiet before a burst of edits is processed (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=4,
+        help="Assets rebuilt in parallel (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--initial",
+        action="store_true",
+        help="Build every asset once at startup"
+    )
+    args = parser.parse_args()
+
+    try:
+        watch(args.manifest, args.debounce, args.jobs, args.initial)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
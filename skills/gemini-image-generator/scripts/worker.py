@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Asset Pipeline Worker
+Queue assets and process them through Gemini → Recraft stages.
+
+Jobs live in a SQLite queue (see jobqueue.py). Each job is one stage of one
+asset; when a stage succeeds the worker enqueues the asset's next stage.
+Start as many workers as you like against the same queue file.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from cache import hash_file
+from generate import create_client, generate_image
+from jobqueue import DEFAULT_DB, DEFAULT_LEASE, JobQueue, worker_id
+from manifest import (asset_paths, default_stages, duplicate_marker, load_manifest, next_stage,
+                      stage_input)
+from phash import DEFAULT_CONFIRM_DISTANCE, DEFAULT_DISTANCE, DEFAULT_INDEX, HashIndex
+from quality import check_image, quarantine
+from quantize import DEFAULT_DESPECKLE, palette_size, quantize_image
+from recraft_process import remove_background, vectorize
+from trim import DEFAULT_PADDING, DEFAULT_THRESHOLD, trim_image
+
+MAX_REGENERATIONS = 2
+
+
+class Heartbeat:
+    """Renew a job lease in the background while a stage runs."""
+
+    def __init__(self, db_path: str, job_id: int, owner: str, lease: float):
+        self.db_path = db_path
+        self.job_id = job_id
+        self.owner = owner
+        self.lease = lease
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        queue = JobQueue(self.db_path)
+        try:
+            while not self.stopped.wait(self.lease / 3):
+                if not queue.renew(self.job_id, self.owner, self.lease):
+                    print(f"Warning: lost lease on job {self.job_id}", file=sys.stderr)
+                    return
+        finally:
+            queue.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        return False
+
+
+class StageRunner:
+    """Run pipeline stages, creating API clients on first use."""
+
+    def __init__(self, hash_index_path: str = DEFAULT_INDEX):
+        self._gemini = None
+        self.hash_index_path = hash_index_path
+        self._hash_indexes = {}
+
+    def gemini(self):
+        if self._gemini is None:
+            self._gemini = create_client(require_env("GEMINI_API_KEY"))
+        return self._gemini
+
+    def hash_index(self, algorithm: str = "dhash") -> HashIndex:
+        # Kept open so the in-memory BK-tree is only built once per process.
+        if algorithm not in self._hash_indexes:
+            self._hash_indexes[algorithm] = HashIndex(self.hash_index_path, algorithm)
+        return self._hash_indexes[algorithm]
+
+    def run(self, stage: str, asset: dict) -> bool:
+        paths = asset_paths(asset)
+        output_path = paths[stage]
+        input_path = stage_input(asset, stage)
+        if input_path and not os.path.exists(input_path):
+            print(f"Error: {stage} input {input_path} not found for {asset['name']}",
+                  file=sys.stderr)
+            return False
+
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        if stage == "generate":
+            # A regeneration must never coalesce with the image it replaces.
+            return generate_image(self.gemini(), asset["prompt"], output_path,
+                                  asset.get("reference"), variant=asset.get("regenerations") or None)
+        if stage == "remove-bg":
+            return remove_background(input_path, output_path, require_env("RECRAFT_API_KEY"))
+        if stage == "trim":
+            return trim_image(input_path, output_path,
+                              asset.get("trim_threshold", DEFAULT_THRESHOLD),
+                              asset.get("trim_padding", DEFAULT_PADDING))
+        if stage == "quantize":
+            return quantize_image(input_path, output_path, asset["colors"],
+                                  asset.get("despeckle", DEFAULT_DESPECKLE))
+        if stage == "vectorize":
+            return vectorize(input_path, output_path, require_env("RECRAFT_API_KEY"))
+
+        print(f"Unknown stage: {stage}", file=sys.stderr)
+        return False
+
+
+def require_env(name: str) -> str:
+    value = os.environ.get(name)
+    if not value:
+        raise RuntimeError(f"{name} environment variable not set.")
+    return value
+
+
+def gate_asset(asset: dict) -> list:
+    """Check the stage's input image and return the jobs that should follow.
+
+    A passing image continues down the pipeline. A failing one is
+    regenerated (up to max_regenerations times), then quarantined. Assets
+    that do not generate are never regenerated, and a failing "input" file
+    is left where it is.
+    """
+    image_path = stage_input(asset, "gate")
+    limits = asset.get("gate") if isinstance(asset.get("gate"), dict) else {}
+    failures, metrics = check_image(image_path, **limits)
+    priority = asset.get("priority", 0)
+    if asset.get("rejected_sha256") and hash_file(image_path) == asset["rejected_sha256"]:
+        failures.append("regeneration returned the previously rejected image")
+
+    if not failures:
+        print(f"Quality gate passed: {image_path}")
+        stage = next_stage(asset, "gate")
+        return [(asset["name"], stage, asset, priority)] if stage else []
+
+    print(f"Quality gate failed for {asset['name']}: {'; '.join(failures)}", file=sys.stderr)
+    regenerations = asset.get("regenerations", 0)
+    if "generate" in asset["stages"] and regenerations < asset.get("max_regenerations",
+                                                                   MAX_REGENERATIONS):
+        retry = dict(asset, regenerations=regenerations + 1,
+                     rejected_sha256=hash_file(image_path))
+        print(f"Regenerating {asset['name']} ({regenerations + 1})")
+        return [(asset["name"], "generate", retry, priority)]
+    if image_path == asset.get("input"):
+        print(f"Stopped {asset['name']}: input {image_path} failed the quality gate",
+              file=sys.stderr)
+        return []
+
+    target = quarantine(image_path, failures, metrics)
+    print(f"Quarantined {asset['name']} to: {target}", file=sys.stderr)
+    return []
+
+
+def dedupe_asset(asset: dict, runner: StageRunner) -> list:
+    """Check the stage's input image against the hash index and return the jobs that follow.
+
+    A new image is indexed and continues down the pipeline. A near-duplicate
+    of an indexed image is flagged and processed anyway, or, with
+    "action": "skip", stopped with a marker file naming the image it
+    duplicates.
+    """
+    image_path = stage_input(asset, "dedupe")
+    settings = asset.get("dedupe") if isinstance(asset.get("dedupe"), dict) else {}
+    index = runner.hash_index(settings.get("algorithm", "dhash"))
+    matches = index.check_and_add(os.path.abspath(image_path), image_path,
+                                  settings.get("max_distance", DEFAULT_DISTANCE),
+                                  settings.get("confirm_distance", DEFAULT_CONFIRM_DISTANCE))
+    marker = duplicate_marker(asset)
+    stage = next_stage(asset, "dedupe")
+    follow_up = [(asset["name"], stage, asset, asset.get("priority", 0))] if stage else []
+
+    if matches:
+        distance, _, original = matches[0]
+        print(f"Near-duplicate: {image_path} ~ {original} (distance {distance})", file=sys.stderr)
+    if not matches or settings.get("action", "flag") != "skip":
+        if os.path.exists(marker):
+            os.remove(marker)
+        return follow_up
+
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump({"duplicate_of": original, "distance": distance,
+                   "matches": [{"path": p, "distance": d} for d, _, p in matches]}, f, indent=2)
+    print(f"Skipped remaining stages for {asset['name']}; see {marker}")
+    return []
+
+
+def enqueue_asset(queue: JobQueue, asset: dict) -> int:
+    """Enqueue the first stage of an asset's pipeline."""
+    return queue.enqueue(asset["name"], asset["stages"][0], asset, asset.get("priority", 0))
+
+
+def run_worker(db_path: str, lease: float, stages: list = None, drain: bool = False,
+               poll: float = 2.0, hash_index: str = DEFAULT_INDEX) -> int:
+    """Claim and run jobs until interrupted (or the queue drains)."""
+    queue = JobQueue(db_path)
+    owner = worker_id()
+    runner = StageRunner(hash_index)
+    processed = 0
+    print(f"Worker {owner} started on {db_path}")
+
+    try:
+        while True:
+            job = queue.claim(owner, lease, stages)
+            if job is None:
+                if drain and queue.pending() == 0:
+                    break
+                time.sleep(poll)
+                continue
+
+            asset = job["payload"]
+            print(f"[job {job['id']}] {job['asset']}: {job['stage']} (attempt {job['attempts']})")
+            follow_up = None
+            try:
+                with Heartbeat(db_path, job["id"], owner, lease):
+                    if job["stage"] == "gate":
+                        follow_up = gate_asset(asset)
+                        success = True
+                    elif job["stage"] == "dedupe":
+                        follow_up = dedupe_asset(asset, runner)
+                        success = True
+                    else:
+                        success = runner.run(job["stage"], asset)
+                error = None if success else f"{job['stage']} failed"
+            except KeyboardInterrupt:
+                queue.fail(job["id"], owner, "worker interrupted", retry_delay=0)
+                raise
+            except Exception as e:
+                success, error = False, f"{type(e).__name__}: {e}"
+
+            if success:
+                if follow_up is None:
+                    follow_up = []
+                    stage = next_stage(asset, job["stage"])
+                    if stage:
+                        follow_up.append((job["asset"], stage, asset, job["priority"]))
+                if not queue.complete(job["id"], owner, follow_up):
+                    print(f"Warning: job {job['id']} lease was lost; result not recorded",
+                          file=sys.stderr)
+            else:
+                print(f"[job {job['id']}] failed: {error}", file=sys.stderr)
+                queue.fail(job["id"], owner, error)
+            processed += 1
+    except KeyboardInterrupt:
+        print("Worker interrupted.")
+    finally:
+        queue.close()
+
+    print(f"Worker {owner} processed {processed} job(s).")
+    return processed
+
+
+def cmd_enqueue(args):
+    if args.manifest:
+        assets = load_manifest(args.manifest)
+    else:
+        if not (args.name and args.prompt):
+            print("Error: --name and --prompt are required without --manifest.", file=sys.stderr)
+            sys.exit(1)
+        assets = [{
+            "name": args.name,
+            "prompt": args.prompt,
+            "reference": os.path.abspath(args.reference) if args.reference else None,
+            "output_dir": os.path.abspath(args.output_dir),
+            "stages": default_stages(args.colors, gate=not args.no_gate,
+                                     dedupe=not args.no_dedupe),
+            "priority": args.priority,
+            "colors": args.colors,
+        }]
+
+    queue = JobQueue(args.db)
+    for asset in assets:
+        job_id = enqueue_asset(queue, asset)
+        print(f"Queued {asset['name']} as job {job_id}")
+    queue.close()
+
+
+def cmd_run(args):
+    stages = args.stages.split(",") if args.stages else None
+    run_worker(args.db, args.lease, stages, args.drain, args.poll, args.hash_index)
+
+
+def cmd_status(args):
+    queue = JobQueue(args.db)
+    rows = queue.counts()
+    queue.close()
+    if not rows:
+        print("Queue is empty.")
+        return
+    print(f"{'STAGE':<12} {'STATE':<8} {'COUNT':>6}")
+    for stage, state, count in rows:
+        print(f"{stage:<12} {state:<8} {count:>6}")
+
+
+def cmd_retry(args):
+    queue = JobQueue(args.db)
+    count = queue.retry_failed()
+    queue.close()
+    print(f"Requeued {count} failed job(s).")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Queue and run asset pipeline jobs (generate → gate → dedupe → remove-bg → trim → vectorize).",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s enqueue --manifest assets.json
+  %(prog)s enqueue --name robot --prompt "Cute robot" --output-dir assets
+  %(prog)s run
+  %(prog)s run --stages remove-bg,vectorize --drain
+  %(prog)s status
+        """
+    )
+    parser.add_argument(
+        "--db",
+        default=DEFAULT_DB,
+        help="Queue database path (default: $ASSET_QUEUE_DB or asset-queue.db)"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = subparsers.add_parser("enqueue", help="Add assets to the queue")
+    enqueue.add_argument("--manifest", help="JSON manifest of assets to queue")
+    enqueue.add_argument("--name", help="Asset name (used for output file names)")
+    enqueue.add_argument("--prompt", help="Text prompt for the asset")
+    enqueue.add_argument("--reference", help="Optional reference image path")
+    enqueue.add_argument("--output-dir", default=".", help="Directory for stage outputs")
+    enqueue.add_argument("--priority", type=int, default=0, help="Higher runs first")
+    enqueue.add_argument("--colors", type=palette_size,
+                         help="Quantize to this many colors before vectorize")
+    enqueue.add_argument("--no-gate", action="store_true",
+                         help="Skip the local quality gate after generation")
+    enqueue.add_argument("--no-dedupe", action="store_true",
+                         help="Skip the near-duplicate check before Recraft")
+    enqueue.set_defaults(func=cmd_enqueue)
+
+    run = subparsers.add_parser("run", help="Process jobs from the queue")
+    run.add_argument("--stages", help="Comma-separated stages this worker accepts")
+    run.add_argument("--lease", type=float, default=DEFAULT_LEASE,
+                     help="Lease timeout in seconds (default: %(default)s)")
+    run.add_argument("--poll", type=float, default=2.0,
+                     help="Seconds to wait when the queue is empty")
+    run.add_argument("--drain", action="store_true",
+                     help="Exit once no queued or leased jobs remain")
+    run.add_argument("--hash-index", default=DEFAULT_INDEX,
+                     help="Perceptual-hash index for the dedupe stage "
+                          "(default: $ASSET_HASH_INDEX or asset-hashes.db)")
+    run.set_defaults(func=cmd_run)
+
+    status = subparsers.add_parser("status", help="Show job counts by stage and state")
+    status.set_defaults(func=cmd_status)
+
+    retry = subparsers.add_parser("retry", help="Requeue failed jobs")
+    retry.set_defaults(func=cmd_retry)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()